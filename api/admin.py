@@ -1,10 +1,292 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin import widgets
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .dashboard import forget_dashboard
+from .journal import journal, journal_entry
 from .models import *
+from .push import publish_attendance
+from .sharding import SHARDED_MODELS, is_sharded, locate, shard_aliases
 
-# Register your models here.
-admin.site.register(User)
-admin.site.register(Department)
-admin.site.register(Attendance)
-admin.site.register(Course)
-admin.site.register(Student)
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never runs an unbounded COUNT(*) on large tables.
+
+    Unfiltered changelists use the planner's row count for the table as the estimate, filtered
+    changelists count at most `count_limit` rows so the query stops early. On SQLite the row count
+    comes from `sqlite_stat1`, which `ANALYZE` (run by `sqlite_maintenance`) keeps current; tables
+    that were never analyzed fall back to the span of their primary keys, two index lookups that
+    overestimate by the rows deleted since.
+    """
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self._estimated_table_rows(queryset)
+            if estimate is not None:
+                return estimate
+        return queryset.order_by()[:self.count_limit].count()
+
+    @staticmethod
+    def _estimated_table_rows(queryset):
+        model = queryset.model
+        connection = connections[queryset.db]
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+                row = cursor.fetchone()
+            elif connection.vendor == 'sqlite':
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+                row = None
+                if cursor.fetchone():
+                    # One row per index; the first number of `stat` is the number of rows it covers.
+                    cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+                    counts = [int(stat.split()[0]) for stat, in cursor.fetchall() if stat]
+                    row = (max(counts),) if counts else None
+                if row is None:
+                    pk = connection.ops.quote_name(model._meta.pk.column)
+                    cursor.execute(f"SELECT MAX({pk}) - MIN({pk}) + 1 FROM {connection.ops.quote_name(table)}")
+                    row = cursor.fetchone()
+            else:
+                return None
+        if not row or row[0] is None or row[0] < 0:
+            return None
+        return int(row[0])
+
+
+class IdFilter(admin.SimpleListFilter):
+    """
+    Changelist filter on a foreign key typed in as an id.
+
+    Filtering goes through the key's own index, where a dropdown of every related row or a search
+    on the related table's columns would have to read whole tables.
+    """
+    template = 'admin/api/id_filter.html'
+    field_name = None
+
+    def lookups(self, request, model_admin):
+        # The value is typed in; a single placeholder entry makes the admin render the filter.
+        return (('', ''),)
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        try:
+            return queryset.filter(**{self.field_name: int(value)})
+        except ValueError:
+            return queryset.none()
+
+    def choices(self, changelist):
+        query_parts = [(name, value) for name, values in changelist.params.items()
+                       if name not in (self.parameter_name, 'p') for value in values]
+        yield {
+            'parameter_name': self.parameter_name,
+            'value': self.value(),
+            'query_parts': query_parts,
+            'clear_query_string': changelist.get_query_string(remove=[self.parameter_name]),
+        }
+
+
+class StudentIdFilter(IdFilter):
+    title = 'student id'
+    parameter_name = 'student'
+    field_name = 'student_id'
+
+
+class CourseIdFilter(IdFilter):
+    title = 'course id'
+    parameter_name = 'course'
+    field_name = 'course_id'
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    raw_id_fields = ('submitted_by',)
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """
+    Changelist filter choosing the shard a sharded model is listed from.
+
+    A changelist is a single query on a single database, so with several entries in
+    `SHARD_DATABASES` the rows are listed one shard at a time, `default` when none is chosen.
+    The filter is hidden when there is only one shard.
+    """
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in shard_aliases()] if is_sharded() else ()
+
+    def queryset(self, request, queryset):
+        alias = self.value()
+        if alias is None:
+            return queryset
+        if alias not in shard_aliases():
+            raise IncorrectLookupParameters(f"Unknown shard {alias!r}.")
+        return queryset.using(alias)
+
+    def choices(self, changelist):
+        current = self.value() or shard_aliases()[0]
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': alias == current,
+                'query_string': changelist.get_query_string({self.parameter_name: alias}),
+                'display': title,
+            }
+
+
+class ShardRawIdWidget(widgets.ForeignKeyRawIdWidget):
+    """Raw id widget whose lookup popup lists the shard the form reads from."""
+
+    def url_parameters(self):
+        return {**super().url_parameters(), ShardFilter.parameter_name: self.db}
+
+
+class ShardedModelAdmin(LargeTableAdmin):
+    """
+    Admin for the models `DepartmentShardRouter` spreads over the shards.
+
+    Changelists read the shard picked with `ShardFilter`. Change, delete and history pages find
+    their row with `locate`, so rows on any shard open from their id, including rows moved by
+    `move_department`. Foreign keys to other sharded models are chosen from the form's shard
+    through a raw id lookup, since autocomplete searches only reach `default`; add forms use the
+    `?shard=` of the changelist they were opened from.
+    """
+
+    def get_list_filter(self, request):
+        return (ShardFilter,) + tuple(super().get_list_filter(request))
+
+    def get_object(self, request, object_id, from_field=None):
+        if from_field is not None or not is_sharded():
+            return super().get_object(request, object_id, from_field)
+        try:
+            obj = locate(self.get_queryset(request), object_id)
+        except (self.model.DoesNotExist, ValidationError, ValueError):
+            return None
+        request._admin_shard = obj._state.db
+        return obj
+
+    def shard_for_request(self, request):
+        alias = getattr(request, '_admin_shard', None) or request.GET.get(ShardFilter.parameter_name)
+        return alias if alias in shard_aliases() else shard_aliases()[0]
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if is_sharded() and db_field.related_model._meta.model_name in SHARDED_MODELS:
+            kwargs.setdefault('using', self.shard_for_request(request))
+            kwargs.setdefault('widget', ShardRawIdWidget(db_field.remote_field, self.admin_site,
+                                                         using=kwargs['using']))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+@admin.register(User)
+class UserAdmin(LargeTableAdmin):
+    list_display = ('id', 'email', 'username', 'full_name', 'type', 'is_staff', 'is_active')
+    list_filter = ('type', 'is_staff', 'is_active')
+    search_fields = ('^email', '^username', '^full_name')
+    ordering = ('-id',)
+    actions = ('activate_users', 'deactivate_users')
+
+    @admin.action(description="Activate selected users")
+    def activate_users(self, request, queryset):
+        updated = queryset.update(is_active=True)
+        self.message_user(request, f"{updated} user(s) activated.")
+
+    @admin.action(description="Deactivate selected users")
+    def deactivate_users(self, request, queryset):
+        updated = queryset.update(is_active=False)
+        self.message_user(request, f"{updated} user(s) deactivated.")
+
+
+@admin.register(Department)
+class DepartmentAdmin(LargeTableAdmin):
+    list_display = ('id', 'department_name', 'updated_at')
+    search_fields = ('^department_name',)
+    ordering = ('department_name',)
+
+
+@admin.register(Course)
+class CourseAdmin(ShardedModelAdmin):
+    list_display = ('id', 'course_name', 'department', 'semester', 'class_name', 'lecture_hours', 'updated_at')
+    list_select_related = ('department',)
+    list_filter = ('semester', 'department')
+    search_fields = ('^course_name', '^class_name')
+    autocomplete_fields = ('department',)
+    ordering = ('-id',)
+
+
+@admin.register(Student)
+class StudentAdmin(ShardedModelAdmin):
+    list_display = ('id', 'full_name', 'department', 'class_name', 'updated_at')
+    list_select_related = ('department',)
+    list_filter = ('department',)
+    search_fields = ('^full_name', '^class_name')
+    autocomplete_fields = ('department', 'user')
+    ordering = ('-id',)
+
+
+class AttendanceAdminForm(forms.ModelForm):
+    class Meta:
+        model = Attendance
+        fields = '__all__'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        student, course = cleaned_data.get('student'), cleaned_data.get('course')
+        if student is not None and course is not None and (
+                (student.department_id, student.class_name) != (course.department_id, course.class_name)):
+            self.add_error('student', "Student is not enrolled in the course's class.")
+        return cleaned_data
+
+
+@admin.register(Attendance)
+class AttendanceAdmin(ShardedModelAdmin):
+    form = AttendanceAdminForm
+    list_display = ('id', 'student', 'course', 'present', 'submitted_by', 'updated_at')
+    list_select_related = ('student', 'course', 'submitted_by')
+    list_filter = ('present', StudentIdFilter, CourseIdFilter)
+    autocomplete_fields = ('student', 'course')
+    ordering = ('-id',)
+    actions = ('mark_present', 'mark_absent')
+
+    def save_model(self, request, obj, form, change):
+        obj.submitted_by = request.user
+        super().save_model(request, obj, form, change)
+
+    def _mark(self, request, queryset, present):
+        now = timezone.now()
+        with transaction.atomic(using=queryset.db):
+            changed = list(queryset.exclude(present=present).select_related('student', 'course'))
+            updated = queryset.update(present=present, submitted_by=request.user, updated_at=now)
+            for attendance in changed:
+                attendance.present, attendance.submitted_by, attendance.updated_at = present, request.user, now
+            entries = [journal_entry(attendance.pk, attendance.student_id, attendance.course_id, not present, present,
+                                     request.user.pk, changed_at=now) for attendance in changed]
+            transaction.on_commit(lambda: journal.enqueue(*entries), using=queryset.db)
+            classes = {(attendance.course.department_id, attendance.course.class_name) for attendance in changed}
+            transaction.on_commit(lambda: [forget_dashboard(*key) for key in classes], using=queryset.db)
+            transaction.on_commit(lambda: [publish_attendance(attendance) for attendance in changed],
+                                  using=queryset.db)
+        return updated
+
+    @admin.action(description="Mark selected attendance as present")
+    def mark_present(self, request, queryset):
+        updated = self._mark(request, queryset, True)
+        self.message_user(request, f"{updated} attendance record(s) marked present.")
+
+    @admin.action(description="Mark selected attendance as absent")
+    def mark_absent(self, request, queryset):
+        updated = self._mark(request, queryset, False)
+        self.message_user(request, f"{updated} attendance record(s) marked absent.")
@@ -5,5 +5,6 @@ class ApiConfig(AppConfig):
     name = 'api'
 
     def ready(self):
+        from . import checks, signals  # noqa: F401
         from .first import create_first_user
         create_first_user()
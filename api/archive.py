@@ -0,0 +1,139 @@
+import datetime
+import gzip
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import serializers
+
+from .changes import tombstones_suppressed
+from .models import *
+
+COLUMNS = ('id', 'student', 'course', 'present', 'submitted_by', 'updated_at')
+_datetime_field = serializers.DateTimeField()
+
+
+def archive_dir():
+    return Path(getattr(settings, 'ARCHIVE_DIR', settings.BASE_DIR / 'archives'))
+
+
+def segment_path(archive, index):
+    return archive_dir() / archive.database / archive.term / f'attendance-{index:06d}.json.gz'
+
+
+def write_segment(path, rows):
+    """Write `rows` as one gzip-compressed columnar segment: each column is stored once as a list of values."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {column: [row[column] for row in rows] for column in COLUMNS}
+    data['updated_at'] = [value.isoformat() for value in data['updated_at']]
+    tmp_path = path.with_suffix('.tmp')
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as segment:
+        json.dump({'columns': list(COLUMNS), 'count': len(rows), 'data': data}, segment, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def read_segment(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as segment:
+        payload = json.load(segment)
+    data = payload['data']
+    return [dict(zip(payload['columns'], values)) for values in zip(*(data[column] for column in payload['columns']))]
+
+
+def archive_batch(archive, batch_size):
+    """
+    Move the next `batch_size` attendance rows of `archive` into a new segment file.
+
+    The segment is written and recorded in the manifest before the rows are deleted, so a run
+    interrupted at any point can simply be started again; at worst a row ends up in two segments,
+    which `archived_attendance` reads once. Returns the number of rows moved.
+    """
+    queryset = Attendance.objects.using(archive.database).filter(updated_at__lt=archive.cutoff)
+    if archive.semester is not None:
+        queryset = queryset.filter(course__semester=archive.semester)
+    rows = list(queryset.order_by('id').values('id', 'student_id', 'course_id', 'present', 'submitted_by_id',
+                                               'updated_at')[:batch_size])
+    if not rows:
+        return 0
+    rows = [{'id': row['id'], 'student': row['student_id'], 'course': row['course_id'], 'present': row['present'],
+             'submitted_by': row['submitted_by_id'], 'updated_at': row['updated_at']} for row in rows]
+
+    write_segment(segment_path(archive, archive.segments), rows)
+    first, last = min(row['updated_at'] for row in rows), max(row['updated_at'] for row in rows)
+    archive.segment_stats = archive.segment_stats[:archive.segments] + [{
+        'first_updated_at': first.isoformat(),
+        'last_updated_at': last.isoformat(),
+        'courses': sorted({row['course'] for row in rows}),
+    }]
+    archive.segments += 1
+    archive.rows += len(rows)
+    archive.first_updated_at = min(filter(None, (archive.first_updated_at, first)))
+    archive.last_updated_at = max(filter(None, (archive.last_updated_at, last)))
+    archive.save()
+    with transaction.atomic(using=archive.database), tombstones_suppressed():
+        Attendance.objects.using(archive.database).filter(id__in=[row['id'] for row in rows]).delete()
+    return len(rows)
+
+
+def parse_range_bound(value, end=False):
+    """
+    Parse a `from`/`to` query value given as a date or a datetime.
+
+    A plain date as the end bound includes that whole day. Raises ValueError for anything else.
+    """
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.datetime.combine(day + datetime.timedelta(days=1) if end else day, datetime.time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def archived_attendance(start=None, end=None, course=None, student=None):
+    """
+    Read archived attendance with `updated_at` in [start, end), optionally for one course or student.
+
+    Only the terms whose archived range overlaps the requested one are considered, and within them
+    only the segments whose recorded `updated_at` range and courses can match are opened; segments
+    archived before those were recorded are always read. Rows are returned in the attendance
+    serializer's format, ordered by id.
+    """
+    archives = AttendanceArchive.objects.exclude(first_updated_at=None)
+    if start is not None:
+        archives = archives.filter(last_updated_at__gte=start)
+    if end is not None:
+        archives = archives.filter(first_updated_at__lt=end)
+
+    rows, seen = [], set()
+    for archive in archives:
+        for index in range(archive.segments):
+            stats = archive.segment_stats[index] if index < len(archive.segment_stats) else None
+            if stats is not None and not _segment_matches(stats, start, end, course):
+                continue
+            for row in read_segment(segment_path(archive, index)):
+                updated_at = parse_datetime(row['updated_at'])
+                if start is not None and updated_at < start or end is not None and updated_at >= end:
+                    continue
+                if course is not None and row['course'] != course or student is not None and row['student'] != student:
+                    continue
+                if row['id'] in seen:
+                    continue
+                seen.add(row['id'])
+                row['updated_at'] = _datetime_field.to_representation(updated_at)
+                rows.append(row)
+    rows.sort(key=lambda row: row['id'])
+    return rows
+
+
+def _segment_matches(stats, start, end, course):
+    if start is not None and parse_datetime(stats['last_updated_at']) < start:
+        return False
+    if end is not None and parse_datetime(stats['first_updated_at']) >= end:
+        return False
+    return course is None or course in stats['courses']
@@ -0,0 +1,77 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger('api')
+
+
+class BackgroundBatcher:
+    """
+    Collect items in memory and hand them to `write` in batches from a background thread.
+
+    The thread flushes every `flush_seconds_setting` seconds, or as soon as `batch_size_setting`
+    items are waiting; whatever is still pending is flushed when the process exits. Subclasses
+    implement `write(items)`.
+    """
+    name = 'batcher'
+    batch_size_setting = None
+    flush_seconds_setting = None
+    default_batch_size = 200
+    default_flush_seconds = 1
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = []
+        self._thread = None
+        atexit.register(self.flush)
+
+    def batch_size(self):
+        return getattr(settings, self.batch_size_setting, self.default_batch_size)
+
+    def flush_seconds(self):
+        return getattr(settings, self.flush_seconds_setting, self.default_flush_seconds)
+
+    def enqueue(self, *items):
+        with self._lock:
+            self._pending.extend(items)
+            full = len(self._pending) >= self.batch_size()
+        self._ensure_flusher()
+        if full:
+            self._wakeup.set()
+
+    def _ensure_flusher(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_seconds())
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception(f'{self.name} flush failed.')
+            finally:
+                close_old_connections()
+
+    def take_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        return pending
+
+    def flush(self):
+        """Write all pending items now and return what `write` returns."""
+        pending = self.take_pending()
+        if not pending:
+            return 0
+        return self.write(pending)
+
+    def write(self, items):
+        raise NotImplementedError
@@ -0,0 +1,143 @@
+import base64
+import binascii
+import json
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import *
+from .serializers import *
+from .sharding import SHARDED_MODELS, fan_out
+
+FEED_RESOURCES = {
+    'departments': (Department, DepartmentSerializer),
+    'courses': (Course, CourseSerializer),
+    'students': (Student, StudentSerializer),
+    'attendance': (Attendance, AttendanceSerializer),
+}
+RESOURCE_FOR_MODEL = {model: resource for resource, (model, serializer) in FEED_RESOURCES.items()}
+TOMBSTONES = 'deleted'
+
+_local = threading.local()
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class ResyncRequired(Exception):
+    pass
+
+
+@contextmanager
+def tombstones_suppressed():
+    """Skip tombstones for deletes that do not remove data, e.g. moving rows between shards."""
+    previous = getattr(_local, 'suppressed', False)
+    _local.suppressed = True
+    try:
+        yield
+    finally:
+        _local.suppressed = previous
+
+
+def record_tombstone(model, pk):
+    resource = RESOURCE_FOR_MODEL.get(model)
+    if resource is None or getattr(_local, 'suppressed', False):
+        return
+    Tombstone.objects.using('default').create(resource=resource, object_id=pk)
+
+
+def busy_timeout(alias='default'):
+    """Seconds a write on `alias` may wait for the SQLite write lock."""
+    return settings.DATABASES[alias].get('OPTIONS', {}).get('timeout', 5)
+
+
+def minimum_lag():
+    """
+    Smallest safe `CHANGE_FEED_LAG`: a row may be stamped up to this long before it commits.
+
+    A write waits up to the busy timeout for the lock, runs for at most `CHANGE_FEED_MAX_WRITE_SECONDS`
+    and may wait for the lock again to commit.
+    """
+    timeouts = [busy_timeout(alias) for alias, config in settings.DATABASES.items()
+                if config['ENGINE'] == 'django.db.backends.sqlite3'] or [0]
+    return 2 * max(timeouts) + getattr(settings, 'CHANGE_FEED_MAX_WRITE_SECONDS', 10)
+
+
+def encode_cursor(positions):
+    payload = {name: [value.isoformat(), pk] for name, (value, pk) in positions.items()}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        positions = {}
+        for name, (value, pk) in payload.items():
+            if name not in FEED_RESOURCES and name != TOMBSTONES:
+                raise InvalidCursor(name)
+            moment = parse_datetime(value)
+            if moment is None:
+                raise InvalidCursor(value)
+            positions[name] = (moment, int(pk))
+        return positions
+    except (binascii.Error, ValueError, TypeError, AttributeError) as err:
+        raise InvalidCursor("Invalid cursor.") from err
+
+
+def _after(queryset, field, position):
+    if position is None:
+        return queryset
+    value, pk = position
+    return queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk}))
+
+
+def _page(queryset, field, limit, sharded):
+    queryset = queryset.order_by(field, 'id')[:limit + 1]
+    rows = list(fan_out(queryset) if sharded else queryset)[:limit + 1]
+    return rows[:limit], len(rows) > limit
+
+
+def build_change_feed(cursor=None, limit=500):
+    """
+    Return the rows created, updated or deleted since `cursor`.
+
+    Rows are read in (`updated_at`, id) order, at most `limit` per resource, and only up to
+    `now - CHANGE_FEED_LAG` so a transaction that commits after its timestamp is still picked up by
+    the next call; `minimum_lag` gives the smallest lag for which that holds. Raises `ResyncRequired` when the cursor is older than the
+    tombstone retention window and `InvalidCursor` when it cannot be decoded.
+    """
+    now = timezone.now()
+    horizon = now - timedelta(seconds=getattr(settings, 'CHANGE_FEED_LAG', 30))
+    retention = timedelta(days=getattr(settings, 'CHANGE_FEED_RETENTION_DAYS', 30))
+
+    if cursor:
+        positions = decode_cursor(cursor)
+        tombstone_position = positions.get(TOMBSTONES)
+        if tombstone_position is None or tombstone_position[0] < now - retention:
+            raise ResyncRequired()
+    else:
+        positions = {TOMBSTONES: (horizon, 0)}
+
+    changes, deleted, has_more = {}, {}, False
+    for resource, (model, serializer_class) in FEED_RESOURCES.items():
+        queryset = _after(model.objects.filter(updated_at__lte=horizon), 'updated_at', positions.get(resource))
+        rows, more = _page(queryset, 'updated_at', limit, model._meta.model_name in SHARDED_MODELS)
+        changes[resource] = serializer_class(rows, many=True).data
+        positions[resource] = (rows[-1].updated_at, rows[-1].id) if more else (horizon, 0)
+        has_more = has_more or more
+
+    queryset = _after(Tombstone.objects.using('default').filter(deleted_at__lte=horizon), 'deleted_at',
+                      positions.get(TOMBSTONES))
+    tombstones, more = _page(queryset, 'deleted_at', limit, sharded=False)
+    for tombstone in tombstones:
+        deleted.setdefault(tombstone.resource, []).append(tombstone.object_id)
+    positions[TOMBSTONES] = (tombstones[-1].deleted_at, tombstones[-1].id) if more else (horizon, 0)
+    has_more = has_more or more
+
+    return {'data': changes, 'deleted': deleted, 'cursor': encode_cursor(positions), 'has_more': has_more}
@@ -0,0 +1,125 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+
+from .batching import BackgroundBatcher
+from .dashboard import forget_dashboard
+from .models import *
+from .journal import journal, journal_entry
+from .push import publish_attendance
+from .roster import roster_cache
+from .sharding import shard_for_department
+
+_signer = signing.Signer(salt='api.checkin')
+
+
+class InvalidCheckinToken(ValueError):
+    pass
+
+
+def window_seconds():
+    return getattr(settings, 'CHECKIN_WINDOW_SECONDS', 30)
+
+
+def issue_token(course, now=None):
+    """
+    Return a signed check-in token for `course` and the current time window, plus its expiry time.
+
+    The token carries the course, its department and the window number, so verifying it and routing
+    the check-in to the right shard need no database lookup.
+    """
+    now = time.time() if now is None else now
+    window = int(now // window_seconds())
+    token = _signer.sign(f'{course.pk}.{course.department_id}.{window}')
+    return token, (window + 1) * window_seconds()
+
+
+def verify_token(token, now=None):
+    """Return (course_id, department_id) for a token of the current or the previous window."""
+    now = time.time() if now is None else now
+    try:
+        course_id, department_id, window = (int(part) for part in _signer.unsign(token).split('.'))
+    except (signing.BadSignature, ValueError, AttributeError):
+        raise InvalidCheckinToken("Invalid check-in token.")
+    if int(now // window_seconds()) - window not in (0, 1):
+        raise InvalidCheckinToken("Check-in token has expired.")
+    return course_id, department_id
+
+
+class CheckinBuffer(BackgroundBatcher):
+    """
+    Per-process buffer that deduplicates self check-ins and writes them to `Attendance` in batches.
+
+    `add` only touches memory; the background flusher writes the pending check-ins every
+    `CHECKIN_FLUSH_SECONDS`, or as soon as `CHECKIN_BATCH_SIZE` are waiting, with one
+    `bulk_create` per shard.
+    """
+    name = 'checkin-flusher'
+    batch_size_setting = 'CHECKIN_BATCH_SIZE'
+    flush_seconds_setting = 'CHECKIN_FLUSH_SECONDS'
+
+    def __init__(self):
+        super().__init__()
+        self._seen = {}
+
+    def add(self, course_id, department_id, student_id, user):
+        now = time.monotonic()
+        key = (course_id, student_id)
+        with self._lock:
+            if self._seen.get(key, 0) > now:
+                return False
+            self._seen[key] = now + getattr(settings, 'CHECKIN_DEDUP_SECONDS', 3 * 60 * 60)
+        self.enqueue((course_id, department_id, student_id, user.pk))
+        return True
+
+    def take_pending(self):
+        with self._lock:
+            now = time.monotonic()
+            self._seen = {key: expires for key, expires in self._seen.items() if expires > now}
+        return super().take_pending()
+
+    def write(self, pending):
+        """Persist the pending check-ins and return the number of attendance rows created."""
+        by_shard = {}
+        for row in pending:
+            by_shard.setdefault(shard_for_department(row[1]), []).append(row)
+        created = 0
+        for alias, rows in by_shard.items():
+            created += self._write(alias, rows)
+        return created
+
+    def _write(self, alias, rows):
+        since = timezone.now() - timedelta(seconds=getattr(settings, 'CHECKIN_DEDUP_SECONDS', 3 * 60 * 60))
+        attendances = []
+        for course_id, department_id, student_id, user_id in rows:
+            course = roster_cache.course(course_id)
+            student = roster_cache.enrolled_student(course, student_id) if course is not None else None
+            if student is not None:
+                attendances.append(Attendance(student=student, course=course, present=True, submitted_by_id=user_id))
+        if attendances:
+            already_marked = set(Attendance.objects.using(alias)
+                                 .filter(course_id__in={attendance.course_id for attendance in attendances},
+                                         student_id__in={attendance.student_id for attendance in attendances},
+                                         present=True, updated_at__gte=since)
+                                 .values_list('course_id', 'student_id'))
+            attendances = [attendance for attendance in attendances
+                           if (attendance.course_id, attendance.student_id) not in already_marked]
+        if not attendances:
+            return 0
+        with transaction.atomic(using=alias):
+            Attendance.objects.using(alias).bulk_create(attendances)
+            entries = [journal_entry(attendance.pk, attendance.student_id, attendance.course_id, None, True,
+                                     attendance.submitted_by_id, created=True, changed_at=attendance.updated_at)
+                       for attendance in attendances]
+            transaction.on_commit(lambda: journal.enqueue(*entries), using=alias)
+            transaction.on_commit(lambda: [publish_attendance(attendance) for attendance in attendances], using=alias)
+            classes = {(attendance.course.department_id, attendance.course.class_name) for attendance in attendances}
+            transaction.on_commit(lambda: [forget_dashboard(*key) for key in classes], using=alias)
+        return len(attendances)
+
+
+checkin_buffer = CheckinBuffer()
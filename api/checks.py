@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+from .changes import minimum_lag
+
+
+@register()
+def check_change_feed_lag(app_configs, **kwargs):
+    """Rows committing after the change feed's horizon passed them would never be sent to clients."""
+    lag = getattr(settings, 'CHANGE_FEED_LAG', 30)
+    if lag > minimum_lag():
+        return []
+    return [Error(
+        f"CHANGE_FEED_LAG ({lag}s) must exceed twice the SQLite busy timeout plus "
+        f"CHANGE_FEED_MAX_WRITE_SECONDS ({minimum_lag()}s), or rows that commit late are skipped by the feed.",
+        hint="Raise CHANGE_FEED_LAG, or lower the 'timeout' database option or CHANGE_FEED_MAX_WRITE_SECONDS.",
+        id='api.E001',
+    )]
@@ -0,0 +1,128 @@
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import *
+from .roster import roster_cache
+from .sharding import for_department
+
+
+def _cache():
+    return caches[getattr(settings, 'DASHBOARD_CACHE', 'default')]
+
+
+def _class_key(department_id, class_name):
+    # Class names are free text; hashed, they never put spaces or control characters in a memcached key.
+    return f'{department_id}:' + hashlib.sha256(class_name.encode()).hexdigest()
+
+
+def _version_key(department_id, class_name):
+    return f'dashboard-version:{_class_key(department_id, class_name)}'
+
+
+def forget_dashboard(department_id, class_name):
+    """Invalidate the cached dashboards of one class, for every semester."""
+    _cache().set(_version_key(department_id, class_name), time.time_ns(), None)
+
+
+def forget_dashboards():
+    """Invalidate every cached dashboard, e.g. after a rollover moved students between classes."""
+    _cache().set('dashboard-version', time.time_ns(), None)
+
+
+def forget_attendance_dashboard(course_id):
+    course = roster_cache.course(course_id)
+    if course is not None:
+        forget_dashboard(course.department_id, course.class_name)
+
+
+def class_dashboard(department, class_name, semester):
+    """
+    Return the dashboard of one class and semester, from the cache when nothing changed since it was built.
+
+    Entries are keyed on a per-class version that attendance, student and course writes replace, so
+    a stale dashboard is never served; `DASHBOARD_CACHE_TTL` only bounds how long unused ones stay.
+    """
+    cache = _cache()
+    version_keys = ['dashboard-version', _version_key(department.pk, class_name)]
+    versions = cache.get_many(version_keys)
+    for version_key in version_keys:
+        if version_key not in versions:
+            # A fresh version rather than a default, so an evicted version never matches older entries.
+            cache.add(version_key, time.time_ns(), None)
+            versions[version_key] = cache.get(version_key)
+    key = f'dashboard:{_class_key(department.pk, class_name)}:{semester}:' + ':'.join(str(versions[k]) for k in version_keys)
+    dashboard = cache.get(key)
+    if dashboard is None:
+        dashboard = build_dashboard(department, class_name, semester)
+        cache.set(key, dashboard, getattr(settings, 'DASHBOARD_CACHE_TTL', 10 * 60))
+    return dashboard
+
+
+def build_dashboard(department, class_name, semester):
+    """
+    Build the dashboard of one class and semester with five queries, whatever the size of the class.
+
+    Attendance counts come from one grouped query over (course, student) and are summed per course and
+    per student in Python. The latest lecture of a course is the local day of its most recent
+    `updated_at`, found for all courses with one grouped `MAX`; the marks of those days come from one
+    more query. Attendance has no lecture date of its own, so correcting an old mark makes the day of
+    the correction that course's latest lecture, showing only the corrected marks until the next roll
+    call. Archived attendance is not included.
+    """
+    courses = list(for_department(Course.objects.all(), department.pk)
+                   .filter(department_id=department.pk, class_name=class_name, semester=semester)
+                   .order_by('course_name', 'id').values('id', 'course_name', 'lecture_hours'))
+    students = list(for_department(Student.objects.all(), department.pk)
+                    .filter(department_id=department.pk, class_name=class_name)
+                    .order_by('full_name', 'id').values('id', 'full_name'))
+    course_ids = [course['id'] for course in courses]
+    student_ids = {student['id'] for student in students}
+
+    attendance = for_department(Attendance.objects.all(), department.pk).filter(
+        course_id__in=course_ids, student__department_id=department.pk, student__class_name=class_name)
+    by_course = {course_id: {'present': 0, 'absent': 0} for course_id in course_ids}
+    by_student = {student_id: {'present': 0, 'absent': 0} for student_id in student_ids}
+    if course_ids and student_ids:
+        counts = (attendance.values('course_id', 'student_id').order_by()
+                  .annotate(present=Count('id', filter=Q(present=True)), total=Count('id')))
+        for row in counts:
+            for totals in (by_course[row['course_id']], by_student[row['student_id']]):
+                totals['present'] += row['present']
+                totals['absent'] += row['total'] - row['present']
+
+    latest = {course_id: {'date': None, 'present': 0, 'absent': 0, 'marks': {}} for course_id in course_ids}
+    if course_ids and student_ids:
+        last_marked = attendance.values('course_id').order_by().annotate(last=Max('updated_at'))
+        days = Q()
+        for row in last_marked:
+            day = timezone.localdate(row['last'])
+            start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+            days |= Q(course_id=row['course_id'], updated_at__gte=start,
+                      updated_at__lt=start + datetime.timedelta(days=1))
+            latest[row['course_id']]['date'] = day.isoformat()
+        if days:
+            for course_id, student_id, present in attendance.filter(days).values_list('course_id', 'student_id',
+                                                                                      'present'):
+                lecture = latest[course_id]
+                lecture['present' if present else 'absent'] += 1
+                lecture['marks'][str(student_id)] = present
+
+    def rate(totals):
+        marked = totals['present'] + totals['absent']
+        return round(totals['present'] / marked, 4) if marked else None
+
+    return {
+        'department': {'id': department.pk, 'department_name': department.department_name},
+        'class_name': class_name,
+        'semester': semester,
+        'courses': [{**course, **by_course[course['id']], 'attendance_rate': rate(by_course[course['id']]),
+                     'latest_lecture': latest[course['id']]} for course in courses],
+        'students': [{**student, **by_student[student['id']], 'attendance_rate': rate(by_student[student['id']])}
+                     for student in students],
+    }
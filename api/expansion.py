@@ -0,0 +1,82 @@
+from django.conf import settings
+
+from .models import *
+from .serializers import *
+from .sharding import fan_out
+
+# Serializer, `included` key and serializer fields of each model that can be expanded. Users are limited
+# to public fields; the rest are serialized in full.
+RESOURCES = {
+    Student: (StudentSerializer, 'students', None),
+    Course: (CourseSerializer, 'courses', None),
+    Department: (DepartmentSerializer, 'departments', None),
+    User: (UserSerializers, 'users', ['id', 'username', 'full_name', 'type']),
+}
+
+# Relations that `?expand=` may follow, per model: serialized field name -> related model.
+RELATIONS = {
+    Attendance: {'student': Student, 'course': Course, 'submitted_by': User},
+    Student: {'department': Department, 'submitted_by': User},
+    Course: {'department': Department, 'submitted_by': User},
+    Department: {'submitted_by': User},
+}
+
+
+class InvalidExpansion(ValueError):
+    pass
+
+
+def parse_ids(value):
+    """Parse a `?ids=1,2,3` query value; raises ValueError when it is malformed or too long."""
+    ids = {int(part) for part in value.split(',') if part.strip()}
+    if not ids or len(ids) > getattr(settings, 'MULTI_GET_MAX_IDS', 1000):
+        raise ValueError(value)
+    return ids
+
+
+def parse_expand(model, value, fields=None, exclude=None):
+    """
+    Turn `student,course.department` into a tree `{'student': {}, 'course': {'department': {}}}`.
+
+    Raises InvalidExpansion for relations `model` does not have, and for relations that the rows'
+    `fields` / `exclude` selection leaves out, as there would be no ids to expand.
+    """
+    tree = {}
+    for path in (path.strip() for path in value.split(',')):
+        if not path:
+            continue
+        node, current = tree, model
+        for name in path.split('.'):
+            if name not in RELATIONS.get(current, {}):
+                raise InvalidExpansion(f"Cannot expand '{path}'.")
+            current = RELATIONS[current][name]
+            node = node.setdefault(name, {})
+        name = path.split('.')[0]
+        if fields is not None and name not in fields or exclude is not None and name in exclude:
+            raise InvalidExpansion(f"Cannot expand '{path}' unless '{name}' is among the returned fields.")
+    return tree
+
+
+def expand(rows, model, tree, included=None):
+    """
+    Side-load the objects referenced by serialized `rows` into `included`, keyed by resource and id.
+
+    Each relation in `tree` costs one `IN` query (one per shard for sharded models) for all rows
+    together, and each object appears once however many rows refer to it. Rows that leave out a
+    relation's field, e.g. through `?fields=`, contribute nothing for it.
+    """
+    included = {} if included is None else included
+    for name, subtree in tree.items():
+        related = RELATIONS[model][name]
+        serializer_class, key, fields = RESOURCES[related]
+        ids = {row[name] for row in rows if row.get(name) is not None}
+        resource = included.setdefault(key, {})
+        missing = ids - {int(pk) for pk in resource}
+        if missing:
+            queryset = serializer_class.project(related.objects.filter(pk__in=missing), fields=fields)
+            objects = fan_out(queryset) if related in (Student, Course) else queryset
+            for data in serializer_class(objects, many=True, fields=fields).data:
+                resource[str(data['id'])] = data
+        if subtree:
+            expand([resource[str(pk)] for pk in ids if str(pk) in resource], related, subtree, included)
+    return included
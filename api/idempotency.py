@@ -0,0 +1,76 @@
+import functools
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.views import Response
+
+
+def _cache():
+    return caches[getattr(settings, 'IDEMPOTENCY_CACHE', 'default')]
+
+
+def _fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path} {payload}'.encode()).hexdigest()
+
+
+def idempotent(view_method):
+    """
+    Replay the stored response when a POST is retried with the same `Idempotency-Key` header.
+
+    Responses are cached per user and key for `IDEMPOTENCY_TTL` seconds. A retry that arrives while the
+    first request is still running waits for it (up to `IDEMPOTENCY_WAIT_SECONDS`) instead of running
+    the write again. Server errors are not stored, so the client can retry them.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'success': False, 'message': "Idempotency-Key must be at most 255 characters."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        cache = _cache()
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        store_key = f'idempotency:{request.user.pk}:{digest}'
+        lock_key = f'{store_key}:lock'
+        fingerprint = _fingerprint(request)
+
+        deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 5)
+        while True:
+            stored = cache.get(store_key)
+            if stored is not None:
+                if stored['fingerprint'] != fingerprint:
+                    return Response({'success': False,
+                                     'message': "Idempotency-Key was already used with a different payload."},
+                                    status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                return Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
+            if cache.add(lock_key, True, getattr(settings, 'IDEMPOTENCY_LOCK_SECONDS', 30)):
+                if cache.get(store_key) is None:
+                    break
+                cache.delete(lock_key)
+                continue
+            if time.monotonic() >= deadline:
+                return Response({'success': False, 'message': "A request with this Idempotency-Key is in progress."},
+                                status=status.HTTP_409_CONFLICT)
+            time.sleep(0.05)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code < 500:
+                cache.set(store_key, {'fingerprint': fingerprint, 'status': response.status_code,
+                                      'data': response.data}, getattr(settings, 'IDEMPOTENCY_TTL', 24 * 60 * 60))
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    return wrapper
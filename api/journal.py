@@ -0,0 +1,46 @@
+from django.utils import timezone
+
+from .batching import BackgroundBatcher
+from .models import AttendanceJournal
+
+
+class AttendanceJournalBuffer(BackgroundBatcher):
+    """
+    Buffer of attendance journal entries, written with one `bulk_create` per batch.
+
+    Marking attendance only appends to this in-memory buffer; the background flusher writes the
+    entries every `JOURNAL_FLUSH_SECONDS` or once `JOURNAL_BATCH_SIZE` are waiting.
+    """
+    name = 'attendance-journal'
+    batch_size_setting = 'JOURNAL_BATCH_SIZE'
+    flush_seconds_setting = 'JOURNAL_FLUSH_SECONDS'
+    default_batch_size = 500
+
+    def write(self, entries):
+        AttendanceJournal.objects.using('default').bulk_create(entries)
+        return len(entries)
+
+
+journal = AttendanceJournalBuffer()
+
+
+def journal_entry(attendance_id, student_id, course_id, old_present, new_present, changed_by_id, created=False,
+                  changed_at=None):
+    return AttendanceJournal(
+        attendance_id=attendance_id, student_id=student_id, course_id=course_id,
+        action=1 if created else 2, old_present=old_present, new_present=new_present,
+        changed_by_id=changed_by_id, changed_at=changed_at or timezone.now())
+
+
+def journal_saved_attendance(attendance, created):
+    """Return the journal entry for a saved attendance row, or None when the mark did not change."""
+    if not created and 'present' in attendance.get_deferred_fields():
+        # Neither loaded nor assigned, so the save did not write the mark.
+        return None
+    old_present = None if created else getattr(attendance, '_loaded_present', None)
+    attendance._loaded_present = attendance.present
+    if not created and old_present == attendance.present:
+        return None
+    return journal_entry(attendance.pk, attendance.student_id, attendance.course_id, old_present,
+                         attendance.present, attendance.submitted_by_id, created=created,
+                         changed_at=attendance.updated_at)
@@ -0,0 +1,166 @@
+import datetime
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+def sqlite_aliases():
+    """Aliases of the file-backed SQLite databases in `DATABASES`."""
+    return [alias for alias, config in settings.DATABASES.items()
+            if config['ENGINE'] == 'django.db.backends.sqlite3' and not connections[alias].is_in_memory_db()]
+
+
+def _pragma(alias, name):
+    with connections[alias].cursor() as cursor:
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()[0]
+
+
+def database_stats(alias):
+    """Size and fragmentation of a SQLite database; only reads PRAGMAs, so it is cheap to call often."""
+    page_size, page_count, freelist = (_pragma(alias, name) for name in ('page_size', 'page_count', 'freelist_count'))
+    path = Path(settings.DATABASES[alias]['NAME'])
+    wal = path.with_name(path.name + '-wal')
+    return {
+        'database': alias,
+        'size_bytes': page_size * page_count,
+        'free_bytes': page_size * freelist,
+        'wal_bytes': wal.stat().st_size if wal.exists() else 0,
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist,
+        'fragmentation': round(freelist / page_count, 4) if page_count else 0.0,
+        'auto_vacuum': AUTO_VACUUM_MODES.get(_pragma(alias, 'auto_vacuum'), 'unknown'),
+        'journal_mode': _pragma(alias, 'journal_mode'),
+        'analyzed': _has_statistics(alias),
+    }
+
+
+def _has_statistics(alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+        return cursor.fetchone() is not None
+
+
+def in_quiet_window(now=None):
+    """Whether the local time falls in `SQLITE_MAINTENANCE_WINDOW`, given as (start hour, end hour)."""
+    start, end = getattr(settings, 'SQLITE_MAINTENANCE_WINDOW', (2, 5))
+    hour = timezone.localtime(now).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+def last_window_start(now=None):
+    """When `SQLITE_MAINTENANCE_WINDOW` last opened at or before `now`."""
+    now = timezone.localtime(now)
+    start = datetime.time(getattr(settings, 'SQLITE_MAINTENANCE_WINDOW', (2, 5))[0])
+    opened = timezone.make_aware(datetime.datetime.combine(now.date(), start))
+    if opened > now:
+        opened = timezone.make_aware(datetime.datetime.combine(now.date() - datetime.timedelta(days=1), start))
+    return opened
+
+
+def next_window_start(now=None):
+    """When `SQLITE_MAINTENANCE_WINDOW` next opens after `now`."""
+    start = datetime.time(getattr(settings, 'SQLITE_MAINTENANCE_WINDOW', (2, 5))[0])
+    return timezone.make_aware(datetime.datetime.combine(last_window_start(now).date() + datetime.timedelta(days=1),
+                                                         start))
+
+
+def backup_dir():
+    return Path(getattr(settings, 'SQLITE_BACKUP_DIR', settings.BASE_DIR / 'backups'))
+
+
+def backup(alias, progress=None):
+    """
+    Copy a live SQLite database with the online backup API and return the path of the copy.
+
+    The copy is made `SQLITE_BACKUP_PAGES` pages at a time with a `SQLITE_BACKUP_SLEEP` pause between
+    steps, so the source is only locked for one short step at a time and writers keep going. A write
+    to the source during the copy makes SQLite restart it, so a backup of a busy database takes longer
+    but is always consistent. Only the newest `SQLITE_BACKUP_KEEP` backups of each database are kept.
+    """
+    directory = backup_dir() / alias
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / f'{alias}-{timezone.now():%Y%m%dT%H%M%S%f}.sqlite3'
+    partial = target.with_suffix('.partial')
+
+    source = sqlite3.connect(settings.DATABASES[alias]['NAME'], timeout=30)
+    destination = sqlite3.connect(partial)
+    try:
+        source.backup(destination, pages=getattr(settings, 'SQLITE_BACKUP_PAGES', 256),
+                      sleep=getattr(settings, 'SQLITE_BACKUP_SLEEP', 0.05), progress=progress)
+        if destination.execute('PRAGMA quick_check').fetchone()[0] != 'ok':
+            raise sqlite3.DatabaseError(f"Backup of '{alias}' failed its integrity check.")
+    finally:
+        destination.close()
+        source.close()
+    os.replace(partial, target)
+
+    for old in sorted(directory.glob(f'{alias}-*.sqlite3'))[:-getattr(settings, 'SQLITE_BACKUP_KEEP', 7)]:
+        old.unlink()
+    return target
+
+
+def optimize(alias):
+    """
+    Refresh the query planner statistics.
+
+    The first run has no statistics to refresh yet, so it runs `ANALYZE` with `SQLITE_ANALYSIS_LIMIT`
+    (rows sampled per index) to bound its cost; later runs use `PRAGMA optimize`, which only
+    re-analyzes tables whose statistics are out of date.
+    """
+    with connections[alias].cursor() as cursor:
+        cursor.execute(f"PRAGMA analysis_limit = {int(getattr(settings, 'SQLITE_ANALYSIS_LIMIT', 1000))}")
+        if _has_statistics(alias):
+            cursor.execute('PRAGMA optimize')
+            return 'optimize'
+        cursor.execute('ANALYZE')
+        return 'analyze'
+
+
+def enable_incremental_vacuum(alias):
+    """
+    Switch a database to `auto_vacuum=INCREMENTAL`.
+
+    SQLite only applies the new mode on a full `VACUUM`, which rewrites the whole file and blocks
+    writers while it runs, so this is done once, in a quiet window.
+    """
+    with connections[alias].cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+
+
+def incremental_vacuum(alias, deadline=None):
+    """
+    Return free pages to the filesystem in steps of `SQLITE_VACUUM_STEP_PAGES` and return how many were freed.
+
+    Each step is its own short write transaction with a pause in between, so attendance writes are
+    only ever held up for one step. Stops when no free pages are left or at `deadline` (a
+    `time.monotonic()` value). Does nothing unless the database uses `auto_vacuum=INCREMENTAL`.
+    """
+    if _pragma(alias, 'auto_vacuum') != 2:
+        return 0
+    step = int(getattr(settings, 'SQLITE_VACUUM_STEP_PAGES', 500))
+    pause = getattr(settings, 'SQLITE_VACUUM_SLEEP', 0.1)
+    freed = 0
+    while deadline is None or time.monotonic() < deadline:
+        before = _pragma(alias, 'freelist_count')
+        if not before:
+            break
+        # A cursor only steps this PRAGMA once (freeing a single page); executescript runs it to completion.
+        connection = connections[alias]
+        connection.ensure_connection()
+        connection.connection.executescript(f'PRAGMA incremental_vacuum({step});')
+        released = before - _pragma(alias, 'freelist_count')
+        if released <= 0:
+            break
+        freed += released
+        time.sleep(pause)
+    return freed
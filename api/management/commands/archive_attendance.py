@@ -0,0 +1,36 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.archive import archive_batch
+from api.models import AttendanceArchive
+from api.sharding import shard_aliases
+
+
+class Command(BaseCommand):
+    help = ("Move the attendance of a closed term out of the hot table into compressed archive segments. "
+            "Re-running the command with the same term resumes an interrupted run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('term', help="Archive name, e.g. 2024-spring.")
+        parser.add_argument('--before', required=True, type=datetime.date.fromisoformat,
+                            help="Archive attendance last updated before this date (YYYY-MM-DD).")
+        parser.add_argument('--semester', type=int, help="Only archive attendance of courses in this semester.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.make_aware(datetime.datetime.combine(options['before'], datetime.time.min))
+        for alias in shard_aliases():
+            archive, created = AttendanceArchive.objects.get_or_create(
+                term=options['term'], database=alias,
+                defaults={'cutoff': cutoff, 'semester': options['semester']})
+            if not created and (archive.cutoff != cutoff or archive.semester != options['semester']):
+                raise CommandError(f"Term '{archive.term}' was started with --before {archive.cutoff.date()} "
+                                   f"and --semester {archive.semester}.")
+            while archive_batch(archive, options['batch_size']):
+                self.stdout.write(f"'{alias}': {archive.rows} rows in {archive.segments} segments.")
+            archive.completed = True
+            archive.save(update_fields=['completed', 'updated_at'])
+            self.stdout.write(self.style.SUCCESS(f"Archived {archive.rows} attendance rows of '{alias}' "
+                                                 f"as term '{archive.term}'."))
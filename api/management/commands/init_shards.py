@@ -0,0 +1,39 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Attendance, Course, Department, Student, User
+from api.sharding import reset_id_range, shard_aliases
+
+
+class Command(BaseCommand):
+    help = "Migrate every shard in SHARD_DATABASES, assign its id range and copy the reference tables onto it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        aliases = shard_aliases()
+        if aliases[0] != 'default':
+            raise CommandError("The first entry of SHARD_DATABASES must be 'default'.")
+        batch_size = options['batch_size']
+
+        for alias in aliases:
+            call_command('migrate', database=alias, interactive=False, verbosity=0)
+            for model in (Course, Student, Attendance):
+                reset_id_range(alias, model)
+            if alias != 'default':
+                for model in (User, Department):
+                    self._copy_reference_table(model, alias, batch_size)
+            self.stdout.write(self.style.SUCCESS(f"Shard '{alias}' is ready."))
+
+    def _copy_reference_table(self, model, alias, batch_size):
+        rows = model.objects.using('default').order_by('pk')
+        fields = [field.attname for field in model._meta.concrete_fields if not field.primary_key]
+        last_pk = 0
+        while True:
+            batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            model.objects.using(alias).bulk_create(batch, update_conflicts=True, unique_fields=['pk'],
+                                                   update_fields=fields)
+            last_pk = batch[-1].pk
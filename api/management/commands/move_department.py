@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from api.changes import tombstones_suppressed
+from api.models import Attendance, Course, Department, Student
+from api.sharding import forget_department, shard_aliases
+
+
+class Command(BaseCommand):
+    help = "Move a department's courses, students and attendance to another shard."
+
+    def add_arguments(self, parser):
+        parser.add_argument('department_id', type=int)
+        parser.add_argument('target', help="Database alias listed in SHARD_DATABASES.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        department_id, target, batch_size = options['department_id'], options['target'], options['batch_size']
+        if target not in shard_aliases():
+            raise CommandError(f"'{target}' is not listed in SHARD_DATABASES.")
+        try:
+            department = Department.objects.using('default').get(pk=department_id)
+        except Department.DoesNotExist:
+            raise CommandError(f"Department {department_id} does not exist.")
+        source = department.shard
+        if source == target:
+            # A move that failed after flipping the shard map leaves the old copies behind; drop them.
+            for alias in shard_aliases():
+                if alias != target and self._delete(self._querysets(alias, department_id), alias):
+                    self.stdout.write(f"Removed leftover rows of department {department_id} from '{alias}'.")
+            self.stdout.write(f"Department {department_id} already lives on '{target}'.")
+            return
+        aliases = shard_aliases()
+        if connections[target].vendor == 'sqlite' and source in aliases and aliases.index(target) < aliases.index(source):
+            # SQLite allocates new ids after the largest id in the table, so the copied rows would move the
+            # target's ids into the source's range and both shards would hand out the same ids.
+            raise CommandError(f"SQLite shards can only move departments to a shard listed after '{source}' "
+                               f"in SHARD_DATABASES.")
+
+        crossing = (Attendance.objects.using(source)
+                    .filter(student__department_id=department_id)
+                    .exclude(course__department_id=department_id))
+        if crossing.exists():
+            raise CommandError(f"Department {department_id} has students marked in other departments' courses; "
+                               f"move those departments together.")
+
+        querysets = self._querysets(source, department_id)
+
+        # Copy first, then flip the shard map, then delete: every step can be re-run after a failure.
+        with transaction.atomic(using=target):
+            for queryset in querysets:
+                copied = self._copy(queryset, target, batch_size)
+                self.stdout.write(f"Copied {copied} {queryset.model._meta.verbose_name_plural}.")
+
+        department.shard = target
+        department.save(update_fields=['shard', 'updated_at'])
+        forget_department(department_id)
+
+        self._delete(querysets, source)
+        self.stdout.write(self.style.SUCCESS(f"Department {department_id} moved from '{source}' to '{target}'."))
+
+    def _querysets(self, alias, department_id):
+        return (
+            Course.objects.using(alias).filter(department_id=department_id),
+            Student.objects.using(alias).filter(department_id=department_id),
+            Attendance.objects.using(alias).filter(course__department_id=department_id),
+        )
+
+    def _delete(self, querysets, alias):
+        with transaction.atomic(using=alias), tombstones_suppressed():
+            return sum([queryset.delete()[0] for queryset in reversed(querysets)])
+
+    def _copy(self, queryset, target, batch_size):
+        copied, last_pk = 0, 0
+        queryset = queryset.order_by('pk')
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return copied
+            queryset.model.objects.using(target).bulk_create(batch, ignore_conflicts=True)
+            copied += len(batch)
+            last_pk = batch[-1].pk
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = "Delete change-feed tombstones older than CHANGE_FEED_RETENTION_DAYS."
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=getattr(settings, 'CHANGE_FEED_RETENTION_DAYS', 30))
+        deleted, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstone(s)."))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.rollover import RolloverError, parse_rollover, rollover
+
+
+def mapping(value):
+    old, sep, new = value.partition('=')
+    if not sep:
+        raise ValueError(value)
+    return old, new
+
+
+class Command(BaseCommand):
+    help = ("Roll over into a new term: promote students from old to new classes and create the next semester's "
+            "courses, in a single transaction.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--class', action='append', dest='classes', type=mapping, default=[],
+                            metavar='OLD=NEW', help="Promote students of class OLD to NEW (repeatable).")
+        parser.add_argument('--semester', action='append', dest='semesters', type=mapping, default=[],
+                            metavar='N=M', help="Create semester M's courses from semester N's (repeatable).")
+        parser.add_argument('--department', action='append', dest='departments', type=int,
+                            help="Only roll over this department (repeatable). Defaults to all.")
+        parser.add_argument('--dry-run', action='store_true', help="Report the counts and roll everything back.")
+
+    def handle(self, *args, **options):
+        try:
+            class_map, semester_map, departments = parse_rollover(dict(options['classes']),
+                                                                  dict(options['semesters']),
+                                                                  options['departments'])
+        except RolloverError as err:
+            raise CommandError(str(err))
+        summary = rollover(class_map, semester_map, departments, dry_run=options['dry_run'])
+
+        for old, count in sorted(summary['classes'].items()):
+            self.stdout.write(f"{count} student(s) of class '{old}' -> '{class_map[old]}'.")
+        for old, count in sorted(summary['semesters'].items()):
+            self.stdout.write(f"{count} course(s) of semester {old} -> {semester_map[old]}.")
+        verb = "Would promote" if options['dry_run'] else "Promoted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {summary['students_promoted']} student(s) and "
+                                             f"{'would create' if options['dry_run'] else 'created'} "
+                                             f"{summary['courses_created']} course(s)."))
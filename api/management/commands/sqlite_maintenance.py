@@ -0,0 +1,99 @@
+import datetime
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.maintenance import (backup, database_stats, enable_incremental_vacuum, in_quiet_window, incremental_vacuum,
+                             last_window_start, next_window_start, optimize, sqlite_aliases)
+
+
+class Command(BaseCommand):
+    help = ("Back up the SQLite databases with the online backup API, refresh planner statistics and return free "
+            "pages with incremental vacuum. Statistics and vacuum only run in SQLITE_MAINTENANCE_WINDOW unless "
+            "--force is given; --loop keeps running as a scheduler.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append', dest='databases',
+                            help="Database alias to maintain (repeatable). Defaults to every SQLite database.")
+        parser.add_argument('--backup', action='store_true', help="Take a hot backup.")
+        parser.add_argument('--optimize', action='store_true', help="Run ANALYZE / PRAGMA optimize.")
+        parser.add_argument('--vacuum', action='store_true', help="Run incremental vacuum.")
+        parser.add_argument('--stats', action='store_true', help="Only report size and fragmentation.")
+        parser.add_argument('--force', action='store_true', help="Also run outside the quiet window.")
+        parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                            help="Switch to auto_vacuum=INCREMENTAL (one full VACUUM, blocks writers).")
+        parser.add_argument('--json', action='store_true', help="Print the statistics as JSON.")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep running: backups every SQLITE_MAINTENANCE_INTERVAL seconds, statistics "
+                                 "and vacuum once each time the quiet window opens.")
+
+    def handle(self, *args, **options):
+        aliases = options['databases'] or sqlite_aliases()
+        unknown = set(aliases) - set(sqlite_aliases())
+        if unknown:
+            raise CommandError(f"Not a file-backed SQLite database: {', '.join(sorted(unknown))}.")
+        tasks = {task for task in ('backup', 'optimize', 'vacuum') if options[task]}
+        if not tasks and not options['stats']:
+            tasks = {'backup', 'optimize', 'vacuum'}
+
+        if options['enable_incremental_vacuum']:
+            if not (options['force'] or in_quiet_window()):
+                raise CommandError("Enabling incremental vacuum rewrites the database; run it in the quiet window "
+                                   "or pass --force.")
+            for alias in aliases:
+                enable_incremental_vacuum(alias)
+                self.stdout.write(self.style.SUCCESS(f"'{alias}' now uses auto_vacuum=INCREMENTAL."))
+
+        if not options['loop']:
+            self.run(aliases, tasks, options['force'], options['json'])
+            return
+
+        # Backups run every interval. Statistics and vacuum run once per quiet window, so the loop also
+        # wakes up when the window opens instead of hoping an interval happens to land inside it.
+        interval = datetime.timedelta(seconds=getattr(settings, 'SQLITE_MAINTENANCE_INTERVAL', 6 * 60 * 60))
+        next_backup = timezone.now()
+        last_window = None
+        while True:
+            now = timezone.now()
+            run_tasks = set()
+            if now >= next_backup:
+                run_tasks |= tasks - {'optimize', 'vacuum'}
+                next_backup = now + interval
+            if in_quiet_window(now) and last_window != last_window_start(now):
+                run_tasks |= tasks & {'optimize', 'vacuum'}
+                last_window = last_window_start(now)
+            self.run(aliases, run_tasks, False, options['json'])
+            wake_at = min(next_backup, next_window_start(now))
+            time.sleep(max((wake_at - timezone.now()).total_seconds(), 1))
+
+    def run(self, aliases, tasks, force, as_json):
+        quiet = force or in_quiet_window()
+        for alias in aliases:
+            if 'backup' in tasks:
+                started = time.monotonic()
+                path = backup(alias)
+                self.stdout.write(f"'{alias}': backed up to {path} in {time.monotonic() - started:.1f}s.")
+            if {'optimize', 'vacuum'} & tasks and not quiet:
+                self.stdout.write(f"'{alias}': outside the quiet window, skipping statistics and vacuum.")
+            elif quiet:
+                if 'optimize' in tasks:
+                    self.stdout.write(f"'{alias}': planner statistics refreshed ({optimize(alias)}).")
+                if 'vacuum' in tasks and database_stats(alias)['auto_vacuum'] != 'incremental':
+                    self.stdout.write(f"'{alias}': auto_vacuum is not incremental, run once with "
+                                      "--enable-incremental-vacuum to allow incremental vacuum.")
+                elif 'vacuum' in tasks:
+                    budget = getattr(settings, 'SQLITE_VACUUM_MAX_SECONDS', 60)
+                    freed = incremental_vacuum(alias, deadline=time.monotonic() + budget)
+                    self.stdout.write(f"'{alias}': incremental vacuum freed {freed} page(s).")
+
+            stats = database_stats(alias)
+            if as_json:
+                self.stdout.write(json.dumps(stats))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"'{alias}': {stats['size_bytes'] / 1024 / 1024:.1f} MiB, "
+                    f"{stats['free_bytes'] / 1024 / 1024:.1f} MiB free ({stats['fragmentation']:.1%} fragmented), "
+                    f"auto_vacuum={stats['auto_vacuum']}, journal_mode={stats['journal_mode']}."))
@@ -0,0 +1,222 @@
+import re
+import threading
+import zlib
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_header_parameters
+
+from .throttling import incr_counter
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+_active = None
+
+
+def admission_state():
+    """Write requests currently running and waiting in this process."""
+    if _active is None:
+        return {'in_flight_writes': 0, 'queued_writes': 0}
+    return {'in_flight_writes': _active.in_flight, 'queued_writes': _active.queued}
+
+
+class AdmissionControlMiddleware:
+    """
+    Cap the number of database-writing requests running at once in this process.
+
+    Up to `ADMISSION_MAX_CONCURRENT_WRITES` write requests run; later ones wait at most
+    `ADMISSION_QUEUE_TIMEOUT` seconds for a slot, and no more than `ADMISSION_MAX_QUEUED` may wait.
+    The rest are shed immediately with 503 and `Retry-After`, so the requests that are admitted keep
+    their latency instead of all of them queueing on the database lock.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.max_concurrent = getattr(settings, 'ADMISSION_MAX_CONCURRENT_WRITES', 8)
+        self.max_queued = getattr(settings, 'ADMISSION_MAX_QUEUED', 32)
+        self.queue_timeout = getattr(settings, 'ADMISSION_QUEUE_TIMEOUT', 2)
+        self.retry_after = getattr(settings, 'ADMISSION_RETRY_AFTER', 1)
+        self.slots = threading.BoundedSemaphore(self.max_concurrent)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.queued = 0
+        global _active
+        _active = self
+
+    def __call__(self, request):
+        if request.method not in WRITE_METHODS:
+            return self.get_response(request)
+
+        admitted = self.slots.acquire(blocking=False)
+        if not admitted:
+            with self.lock:
+                can_queue = self.queued < self.max_queued
+                if can_queue:
+                    self.queued += 1
+            if can_queue:
+                try:
+                    admitted = self.slots.acquire(timeout=self.queue_timeout)
+                finally:
+                    with self.lock:
+                        self.queued -= 1
+        if not admitted:
+            incr_counter('shed')
+            response = JsonResponse({'success': False, 'message': "Server is busy, please retry shortly."},
+                                    status=503)
+            response['Retry-After'] = str(self.retry_after)
+            return response
+
+        with self.lock:
+            self.in_flight += 1
+        try:
+            return self.get_response(request)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+            self.slots.release()
+
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_COMPRESSED_TYPES = ('application/json', 'application/msgpack', 'application/cbor', 'text/event-stream')
+
+_accept_encoding_re = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+class _GzipStream:
+    def __init__(self):
+        level = getattr(settings, 'COMPRESSION_LEVELS', {}).get('gzip', 6)
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self):
+        quality = getattr(settings, 'COMPRESSION_LEVELS', {}).get('br', 5)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def chunk(self, data):
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class _ZstdStream:
+    def __init__(self):
+        level = getattr(settings, 'COMPRESSION_LEVELS', {}).get('zstd', 3)
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def chunk(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+def available_encodings():
+    """Content codings this process can produce, in server preference order."""
+    encodings = {}
+    if zstandard is not None:
+        encodings['zstd'] = _ZstdStream
+    if brotli is not None:
+        encodings['br'] = _BrotliStream
+    encodings['gzip'] = _GzipStream
+    return encodings
+
+
+def negotiate_encoding(accept_encoding, encodings):
+    """Pick the coding from `encodings` with the highest q-value in `accept_encoding`; ties go to server order."""
+    weights = {}
+    for coding, q in _accept_encoding_re.findall(accept_encoding.lower()):
+        try:
+            weights[coding] = float(q) if q else 1.0
+        except ValueError:
+            continue
+    best, best_weight = None, 0
+    for coding in encodings:
+        weight = weights.get(coding, weights.get('*', 0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compress API responses with the best coding the client accepts: zstd, br or gzip.
+
+    Only media types listed in `COMPRESSION_CONTENT_TYPES` are compressed. HTML pages (the admin and
+    the browsable API) carry CSRF tokens next to text echoed from the request, which is what a BREACH
+    attack reads back through compressed sizes, so they are always sent uncompressed.
+
+    zstd and br are offered only when the `zstandard` and `brotli` packages are installed. Streaming
+    responses (including the async attendance stream) are compressed chunk by chunk and flushed after
+    each chunk, so events still reach the client as soon as they are produced. Bodies shorter than
+    `COMPRESSION_MIN_LENGTH` bytes are sent as they are.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.encodings = available_encodings()
+        self.min_length = getattr(settings, 'COMPRESSION_MIN_LENGTH', 200)
+        self.content_types = frozenset(getattr(settings, 'COMPRESSION_CONTENT_TYPES', DEFAULT_COMPRESSED_TYPES))
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header('Content-Encoding'):
+            return response
+        if parse_header_parameters(response.get('Content-Type', ''))[0].lower() not in self.content_types:
+            return response
+        if not response.streaming and len(response.content) < self.min_length:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.encodings)
+        if coding is None:
+            return response
+        stream = self.encodings[coding]()
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self._compress_async(stream, response.streaming_content)
+            else:
+                response.streaming_content = self._compress(stream, response.streaming_content)
+            del response['Content-Length']
+        else:
+            compressed = stream.chunk(response.content) + stream.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding
+        return response
+
+    @staticmethod
+    def _compress(stream, content):
+        for data in content:
+            yield stream.chunk(data)
+        yield stream.finish()
+
+    @staticmethod
+    async def _compress_async(stream, content):
+        async for data in content:
+            yield stream.chunk(data)
+        yield stream.finish()
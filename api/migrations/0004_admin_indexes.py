@@ -0,0 +1,46 @@
+# Generated by Django 5.1 on 2026-10-19 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_user_type'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['course', 'present'], name='attendance_course_present_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['department', 'semester'], name='course_department_semester_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['course_name'], name='course_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='department',
+            index=models.Index(fields=['department_name'], name='department_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['department', 'class_name'], name='student_department_class_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['full_name'], name='student_full_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['type'], name='user_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['full_name'], name='user_full_name_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-19 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='shard',
+            field=models.CharField(default='default', max_length=50),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1 on 2026-10-19 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_department_shard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(choices=[('departments', 'Departments'), ('courses', 'Courses'), ('students', 'Students'), ('attendance', 'Attendance')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['updated_at', 'id'], name='attendance_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['updated_at', 'id'], name='course_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='department',
+            index=models.Index(fields=['updated_at', 'id'], name='department_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['updated_at', 'id'], name='student_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='tombstone_changes_idx'),
+        ),
+    ]
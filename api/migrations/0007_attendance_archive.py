@@ -0,0 +1,32 @@
+# Generated by Django 5.1 on 2026-10-19 14:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50)),
+                ('database', models.CharField(default='default', max_length=50)),
+                ('cutoff', models.DateTimeField()),
+                ('semester', models.IntegerField(blank=True, null=True)),
+                ('segments', models.IntegerField(default=0)),
+                ('rows', models.BigIntegerField(default=0)),
+                ('first_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('last_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('completed', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('term', 'database'), name='attendance_archive_term_database_uniq')],
+            },
+        ),
+    ]
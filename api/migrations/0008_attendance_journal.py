@@ -0,0 +1,30 @@
+# Generated by Django 5.1 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_attendance_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceJournal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attendance_id', models.BigIntegerField()),
+                ('student_id', models.BigIntegerField()),
+                ('course_id', models.BigIntegerField()),
+                ('action', models.PositiveSmallIntegerField(choices=[(1, 'Created'), (2, 'Updated')])),
+                ('old_present', models.BooleanField(null=True)),
+                ('new_present', models.BooleanField()),
+                ('changed_by_id', models.BigIntegerField(null=True)),
+                ('changed_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['student_id', 'changed_at'], name='journal_student_idx'), models.Index(fields=['course_id', 'changed_at'], name='journal_course_idx'), models.Index(fields=['attendance_id', 'changed_at'], name='journal_attendance_idx')],
+            },
+        ),
+    ]
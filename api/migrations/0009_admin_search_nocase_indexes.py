@@ -0,0 +1,63 @@
+# Generated by Django 5.1 on 2026-10-19 14:29
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_attendance_journal'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='course',
+            name='course_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='department',
+            name='department_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='student',
+            name='student_full_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_full_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(django.db.models.functions.comparison.Collate('course_name', 'NOCASE'), name='course_name_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(django.db.models.functions.comparison.Collate('class_name', 'NOCASE'), name='course_class_name_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='department',
+            index=models.Index(django.db.models.functions.comparison.Collate('department_name', 'NOCASE'), name='department_name_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(django.db.models.functions.comparison.Collate('full_name', 'NOCASE'), name='student_full_name_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(django.db.models.functions.comparison.Collate('class_name', 'NOCASE'), name='student_class_name_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.comparison.Collate('full_name', 'NOCASE'), name='user_full_name_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.comparison.Collate('username', 'NOCASE'), name='user_username_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.comparison.Collate('email', 'NOCASE'), name='user_email_ci_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1 on 2026-10-19 14:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_admin_search_nocase_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='user',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='student_record', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-19 14:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_student_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancearchive',
+            name='segment_stats',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
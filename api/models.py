@@ -3,6 +3,8 @@ from django.core.validators import RegexValidator
 from django.core.validators import validate_email
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.db import models
+from django.db.models.functions import Collate
+from .sharding import ShardedQuerySet
 
 name_validator = RegexValidator(r'^[a-zA-Z ]+$', 'Only alphabetic characters are allowed.')
 
@@ -52,6 +54,15 @@ class User(AbstractBaseUser, PermissionsMixin):
     REQUIRED_FIELDS = ['full_name', 'username']
     objects = UserManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['type'], name='user_type_idx'),
+            # NOCASE indexes serve the admin's case-insensitive prefix searches (LIKE 'abc%') on SQLite.
+            models.Index(Collate('full_name', 'NOCASE'), name='user_full_name_ci_idx'),
+            models.Index(Collate('username', 'NOCASE'), name='user_username_ci_idx'),
+            models.Index(Collate('email', 'NOCASE'), name='user_email_ci_idx'),
+        ]
+
     def tokens(self):
         refresh = RefreshToken.for_user(self)
         return {
@@ -62,9 +73,16 @@ class User(AbstractBaseUser, PermissionsMixin):
 
 class Department(models.Model):
     department_name = models.CharField(max_length=100)
+    shard = models.CharField(max_length=50, default='default')
     submitted_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(Collate('department_name', 'NOCASE'), name='department_name_ci_idx'),
+            models.Index(fields=['updated_at', 'id'], name='department_changes_idx'),
+        ]
+
     def __str__(self):
         return self.department_name
 
@@ -78,6 +96,16 @@ class Course(models.Model):
     submitted_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['department', 'semester'], name='course_department_semester_idx'),
+            models.Index(Collate('course_name', 'NOCASE'), name='course_name_ci_idx'),
+            models.Index(Collate('class_name', 'NOCASE'), name='course_class_name_ci_idx'),
+            models.Index(fields=['updated_at', 'id'], name='course_changes_idx'),
+        ]
+
     def __str__(self):
         return self.course_name
 
@@ -86,9 +114,22 @@ class Student(models.Model):
     full_name = models.CharField(max_length=100)
     department = models.ForeignKey(Department, on_delete=models.CASCADE)
     class_name = models.CharField(max_length=100)
+    # The student's own login, used for self check-in.
+    user = models.OneToOneField(User, null=True, blank=True, on_delete=models.SET_NULL,
+                                related_name='student_record')
     submitted_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['department', 'class_name'], name='student_department_class_idx'),
+            models.Index(Collate('full_name', 'NOCASE'), name='student_full_name_ci_idx'),
+            models.Index(Collate('class_name', 'NOCASE'), name='student_class_name_ci_idx'),
+            models.Index(fields=['updated_at', 'id'], name='student_changes_idx'),
+        ]
+
     def __str__(self):
         return self.full_name
 
@@ -100,5 +141,103 @@ class Attendance(models.Model):
     submitted_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', 'present'], name='attendance_course_present_idx'),
+            models.Index(fields=['updated_at', 'id'], name='attendance_changes_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored mark so the change journal can record the value an update replaces.
+        instance._loaded_present = instance.__dict__.get('present', models.DEFERRED)
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        if fields is None or 'present' in fields:
+            self._loaded_present = self.present
+
+    def save(self, *args, **kwargs):
+        if getattr(self, '_loaded_present', None) is models.DEFERRED and 'present' not in self.get_deferred_fields():
+            # `present` was deferred and then assigned without being read: load the mark it replaces.
+            self._loaded_present = (Attendance._base_manager.using(self._state.db).filter(pk=self.pk)
+                                    .values_list('present', flat=True).first())
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.student.full_name} - {self.course.course_name} - {'Present' if self.present else 'Absent'}"
+
+
+class Tombstone(models.Model):
+    """Marker left behind by a deleted row so change-feed clients can drop it from their cache."""
+    RESOURCE_TYPE = (
+        ('departments', "Departments"),
+        ('courses', "Courses"),
+        ('students', "Students"),
+        ('attendance', "Attendance"),
+    )
+    resource = models.CharField(choices=RESOURCE_TYPE, max_length=20)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_changes_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.resource} {self.object_id} deleted"
+
+
+class AttendanceArchive(models.Model):
+    """Manifest of one term's attendance archived from one shard into compressed columnar segment files."""
+    term = models.CharField(max_length=50)
+    database = models.CharField(max_length=50, default='default')
+    cutoff = models.DateTimeField()
+    semester = models.IntegerField(null=True, blank=True)
+    segments = models.IntegerField(default=0)
+    rows = models.BigIntegerField(default=0)
+    first_updated_at = models.DateTimeField(null=True, blank=True)
+    last_updated_at = models.DateTimeField(null=True, blank=True)
+    # One entry per segment file: its `updated_at` range and course ids, so reads can skip whole segments.
+    segment_stats = models.JSONField(default=list, blank=True)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'database'], name='attendance_archive_term_database_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} ({self.database})"
+
+
+class AttendanceJournal(models.Model):
+    """Append-only record of attendance marks being created or changed."""
+    ACTION_TYPE = (
+        (1, "Created"),
+        (2, "Updated"),
+    )
+    attendance_id = models.BigIntegerField()
+    student_id = models.BigIntegerField()
+    course_id = models.BigIntegerField()
+    action = models.PositiveSmallIntegerField(choices=ACTION_TYPE)
+    old_present = models.BooleanField(null=True)
+    new_present = models.BooleanField()
+    changed_by_id = models.BigIntegerField(null=True)
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student_id', 'changed_at'], name='journal_student_idx'),
+            models.Index(fields=['course_id', 'changed_at'], name='journal_course_idx'),
+            models.Index(fields=['attendance_id', 'changed_at'], name='journal_attendance_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.attendance_id}: {self.old_present} -> {self.new_present}"
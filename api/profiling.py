@@ -0,0 +1,232 @@
+import cProfile
+import json
+import logging
+import pstats
+import random
+import re
+import shutil
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_FILES = {
+    'meta': 'meta.json',
+    'pstats': 'profile.pstats',
+    'stacks': 'stacks.folded',
+}
+_capture_id_re = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$')
+
+
+def profile_dir():
+    return Path(getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def capture_path(capture_id):
+    """Directory of a capture, or None if `capture_id` is not a well-formed capture id."""
+    if not _capture_id_re.match(capture_id):
+        return None
+    return profile_dir() / capture_id
+
+
+def list_captures():
+    """Summaries of the stored captures, newest first; the query list and allocation sites are left out."""
+    captures = []
+    for path in sorted(profile_dir().glob('*/meta.json'), reverse=True):
+        try:
+            meta = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        meta.pop('queries', None)
+        meta.pop('top_allocations', None)
+        meta['files'] = sorted(name for name, filename in CAPTURE_FILES.items() if (path.parent / filename).exists())
+        captures.append(meta)
+    return captures
+
+
+def folded_stacks(stats):
+    """
+    Collapse a cProfile call graph into `frame;frame;frame microseconds` lines for flamegraph tools.
+
+    cProfile records caller/callee pairs rather than full stacks, so each callee's time is split
+    between its callers in proportion to what it spent under each of them. The result is an
+    approximation that is exact for call trees without shared callees.
+    """
+    children = {}
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        for caller, caller_stats in callers.items():
+            children.setdefault(caller, []).append((func, caller_stats[3]))
+    roots = [func for func, entry in stats.stats.items() if not entry[4]]
+
+    def label(func):
+        filename, line, name = func
+        return f'{name} ({Path(filename).name}:{line})' if line else name
+
+    lines = {}
+
+    def walk(func, stack, on_stack, share):
+        total = stats.stats[func][3]
+        # Branches worth less than a microsecond would be dropped from the output anyway; skipping
+        # them keeps the walk from enumerating every path through a large call graph.
+        if share < 1e-6 or total <= 0:
+            return
+        ratio = min(share / total, 1.0)
+        stack = stack + [label(func)]
+        own = stats.stats[func][2] * ratio
+        if own > 0:
+            key = ';'.join(stack)
+            lines[key] = lines.get(key, 0) + own
+        if len(stack) >= 100:
+            return
+        on_stack = on_stack | {func}
+        for child, child_time in children.get(func, ()):
+            if child not in on_stack:
+                walk(child, stack, on_stack, child_time * ratio)
+
+    for root in roots:
+        walk(root, [], frozenset(), stats.stats[root][3])
+    return '\n'.join(f'{stack} {int(seconds * 1_000_000)}' for stack, seconds in lines.items()
+                     if int(seconds * 1_000_000))
+
+
+def _prune():
+    captures = sorted(path for path in profile_dir().iterdir() if capture_path(path.name) is not None)
+    for path in captures[:-getattr(settings, 'PROFILING_MAX_CAPTURES', 50)]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class QueryRecorder:
+    def __init__(self, alias):
+        self.alias = alias
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({'database': self.alias, 'sql': sql,
+                                 'time_ms': round((time.perf_counter() - start) * 1000, 3)})
+
+
+class ProfilingMiddleware:
+    """
+    Profile selected requests and keep the results in a bounded on-disk ring under `PROFILING_DIR`.
+
+    Only installed when `PROFILING_ENABLED` is set; otherwise Django drops it at startup and requests
+    pay nothing. A request is profiled when a staff user sends `X-Profile: 1` (or `?profile=1`), or
+    when it is picked by `PROFILING_SAMPLE_RATE`. One request is profiled at a time per process, since
+    tracemalloc is process-wide; requests arriving meanwhile simply run unprofiled.
+
+    Each capture holds the cProfile stats, folded stacks for flamegraph tools, and the SQL queries
+    with their timings plus the peak traced memory and top allocation sites in `meta.json`.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        requested = request.headers.get('X-Profile') == '1' or request.GET.get('profile') == '1'
+        if requested:
+            user = self._staff_user(request)
+            if user is None:
+                return self.get_response(request)
+        elif self.sample_rate and random.random() < self.sample_rate:
+            user = None
+        else:
+            return self.get_response(request)
+
+        if not self.lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self._profile(request, user)
+        finally:
+            self.lock.release()
+
+    @staticmethod
+    def _staff_user(request):
+        if getattr(request, 'user', None) is not None and request.user.is_staff:
+            return request.user
+        try:
+            authenticated = JWTAuthentication().authenticate(request)
+        except (AuthenticationFailed, InvalidToken):
+            return None
+        if authenticated is None or not authenticated[0].is_staff:
+            return None
+        return authenticated[0]
+
+    def _profile(self, request, user):
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(getattr(settings, 'PROFILING_TRACEMALLOC_FRAMES', 1))
+        tracemalloc.reset_peak()
+        recorders = [QueryRecorder(alias) for alias in connections]
+        profiler = cProfile.Profile()
+        started_at = timezone.now()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for recorder in recorders:
+                    stack.enter_context(connections[recorder.alias].execute_wrapper(recorder))
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+            duration = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            allocations = tracemalloc.take_snapshot().statistics('lineno')[:20]
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        try:
+            self._save(request, user, response, profiler, started_at, duration, peak, allocations, recorders)
+        except OSError:
+            logger.exception("Could not store the profile of %s %s.", request.method, request.path)
+        return response
+
+    def _save(self, request, user, response, profiler, started_at, duration, peak, allocations, recorders):
+        capture_id = f'{started_at:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}'
+        path = profile_dir() / capture_id
+        path.mkdir(parents=True)
+
+        profiler.dump_stats(path / CAPTURE_FILES['pstats'])
+        stats = pstats.Stats(profiler)
+        (path / CAPTURE_FILES['stacks']).write_text(folded_stacks(stats))
+        queries = [query for recorder in recorders for query in recorder.queries]
+        meta = {
+            'id': capture_id,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'user': user.pk if user is not None else None,
+            'sampled': user is None,
+            'status': response.status_code,
+            'started_at': started_at.isoformat(),
+            'duration_ms': round(duration * 1000, 3),
+            'cpu_calls': stats.total_calls,
+            'query_count': len(queries),
+            'query_time_ms': round(sum(query['time_ms'] for query in queries), 3),
+            'queries': queries,
+            'peak_memory_bytes': peak,
+            'top_allocations': [{'site': str(stat.traceback), 'size_bytes': stat.size, 'count': stat.count}
+                                for stat in allocations],
+        }
+        (path / CAPTURE_FILES['meta']).write_text(json.dumps(meta, indent=1))
+        _prune()
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+from .serializers import AttendanceSerializer
+
+
+def attendance_topics(attendance):
+    """Topics an attendance write is published to: its course, the course's department and the student's class."""
+    student, course = attendance.student, attendance.course
+    return {
+        f'course:{course.pk}',
+        f'department:{course.department_id}',
+        f'class:{student.department_id}:{student.class_name}',
+    }
+
+
+class Subscription:
+    """
+    Bounded queue of events for one connected client.
+
+    When a slow client lets the queue fill up, further events are dropped and the subscription is
+    marked `lagged`; the stream then tells the client to catch up through the change feed instead
+    of letting the backlog grow without bound.
+    """
+
+    def __init__(self, topics, loop, max_pending):
+        self.topics = frozenset(topics)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.lagged = False
+
+    def _put(self, event):
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class InProcessBroker:
+    """
+    Pub/sub for a single ASGI process.
+
+    `publish` may be called from any thread (sync views run in a worker thread); events are handed
+    to each subscriber's event loop. Run one process per broker or plug in a shared broker through
+    the `PUSH_BROKER` setting when serving from several processes.
+    """
+
+    def __init__(self, max_pending=None):
+        self.max_pending = max_pending or getattr(settings, 'PUSH_MAX_PENDING_EVENTS', 100)
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics):
+        subscription = Subscription(topics, asyncio.get_running_loop(), self.max_pending)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscriptions[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscriptions.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[topic]
+
+    def has_subscribers(self, topics):
+        with self._lock:
+            return any(topic in self._subscriptions for topic in topics)
+
+    def publish(self, topics, event):
+        """Deliver `event` once to every subscription listening on at least one of `topics`."""
+        with self._lock:
+            subscriptions = set().union(*(self._subscriptions.get(topic, ()) for topic in topics))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(getattr(settings, 'PUSH_BROKER', 'api.push.InProcessBroker'))()
+    return _broker
+
+
+def publish_attendance(attendance):
+    """Push a committed attendance write to its subscribers; serialization is skipped when nobody listens."""
+    broker = get_broker()
+    topics = attendance_topics(attendance)
+    if broker.has_subscribers(topics):
+        broker.publish(topics, {'event': 'attendance', 'data': AttendanceSerializer(attendance).data})
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def event_stream(topics, heartbeat=None):
+    """Yield Server-Sent Events for `topics` until the client disconnects."""
+    heartbeat = heartbeat or getattr(settings, 'PUSH_HEARTBEAT_SECONDS', 15)
+    broker = get_broker()
+    subscription = broker.subscribe(topics)
+    try:
+        yield format_event('subscribed', {'topics': sorted(topics)})
+        while True:
+            try:
+                event = await subscription.get(heartbeat)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            yield format_event(event['event'], event['data'])
+            if subscription.lagged and subscription.queue.empty():
+                yield format_event('resync', {'message': "Too many pending events, catch up via the change feed."})
+                return
+    finally:
+        broker.unsubscribe(subscription)
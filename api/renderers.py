@@ -0,0 +1,100 @@
+from django.utils.http import parse_header_parameters
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+_encoder = JSONEncoder()
+
+
+def columnar(data):
+    """
+    Rewrite the `data` list of a response as `{'columns': [...], 'rows': [[...], ...]}`.
+
+    Keys are sent once instead of once per row. Responses whose `data` is not a list of objects
+    with the same keys are returned unchanged.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('data'), list):
+        return data
+    rows = data['data']
+    if not rows or not all(isinstance(row, dict) for row in rows):
+        return data
+    columns = list(rows[0])
+    if any(len(row) != len(columns) or any(column not in row for column in columns) for row in rows):
+        return data
+    return {**data, 'data': {'columns': columns, 'rows': [[row[column] for column in columns] for row in rows]}}
+
+
+class ColumnarLayoutMixin:
+    """Use the columnar list layout when the client asks for it, e.g. `Accept: application/json; layout=columnar`."""
+
+    def apply_layout(self, data, accepted_media_type):
+        params = parse_header_parameters(accepted_media_type or '')[1]
+        if params.get('layout') == 'columnar':
+            return columnar(data)
+        return data
+
+
+class JSONRenderer(ColumnarLayoutMixin, renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(self.apply_layout(data, accepted_media_type), accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(ColumnarLayoutMixin, renderers.BaseRenderer):
+    """Render responses as MessagePack. Requires the `msgpack` package."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(self.apply_layout(data, accepted_media_type), default=_encoder.default,
+                             use_bin_type=True)
+
+
+class CBORRenderer(ColumnarLayoutMixin, renderers.BaseRenderer):
+    """Render responses as CBOR. Requires the `cbor2` package."""
+    media_type = 'application/cbor'
+    format = 'cbor'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return cbor2.dumps(self.apply_layout(data, accepted_media_type),
+                           default=lambda encoder, value: encoder.encode(_encoder.default(value)))
+
+
+class MessagePackParser(BaseParser):
+    """Parse MessagePack request bodies. Requires the `msgpack` package."""
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError) as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
+
+
+class CBORParser(BaseParser):
+    """Parse CBOR request bodies. Requires the `cbor2` package."""
+    media_type = 'application/cbor'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return cbor2.loads(stream.read())
+        except (cbor2.CBORDecodeError, ValueError, TypeError) as exc:
+            raise ParseError(f"CBOR parse error - {exc}")
@@ -0,0 +1,145 @@
+from contextlib import ExitStack
+
+from django.db import transaction
+from django.db.models import Case, CharField, Count, F, Value, When
+from django.utils import timezone
+
+from .dashboard import forget_dashboards
+from .models import *
+from .roster import roster_cache
+from .sharding import shard_aliases
+
+
+class RolloverError(ValueError):
+    pass
+
+
+class _DryRun(Exception):
+    pass
+
+
+def parse_rollover(classes=None, semesters=None, departments=None):
+    """
+    Validate a rollover request and return (class_map, semester_map, department_ids).
+
+    `classes` maps old class names to new ones and `semesters` maps a semester to the one whose
+    courses it seeds; semester keys may be given as strings, as JSON object keys are.
+    """
+    classes, semesters = classes or {}, semesters or {}
+    if not isinstance(classes, dict) or not isinstance(semesters, dict):
+        raise RolloverError("'classes' and 'semesters' must be objects.")
+    if not classes and not semesters:
+        raise RolloverError("Pass at least one class or semester mapping.")
+
+    class_map = {}
+    for old, new in classes.items():
+        if not isinstance(new, str) or not old.strip() or not new.strip():
+            raise RolloverError("Class names must be non-empty strings.")
+        if old != new:
+            class_map[old] = new
+
+    semester_map = {}
+    for old, new in semesters.items():
+        try:
+            old, new = int(old), int(new)
+        except (TypeError, ValueError):
+            raise RolloverError("Semesters must be integers.")
+        if old == new:
+            raise RolloverError(f"Semester {old} cannot roll over into itself.")
+        semester_map[old] = new
+
+    if departments is not None:
+        if not isinstance(departments, list):
+            raise RolloverError("'departments' must be a list of department ids.")
+        try:
+            departments = [int(department) for department in departments]
+        except (TypeError, ValueError):
+            raise RolloverError("'departments' must be a list of department ids.")
+    return class_map, semester_map, departments
+
+
+def rollover(class_map, semester_map, departments=None, dry_run=False, user=None):
+    """
+    Promote students to their new classes and create the next semester's courses, set-based.
+
+    All students of every mapped class are moved with one `UPDATE` per shard, mapping every class at
+    once so chains such as A -> B, B -> C do not promote anyone twice. For each semester mapping the
+    courses of the old semester are copied into the new one with one `bulk_create` per shard, their
+    class renamed through `class_map`; courses that already exist in the new semester are skipped,
+    so a rollover interrupted before it committed can simply be run again.
+
+    Everything runs in one transaction per shard, all opened together and rolled back together if
+    anything fails. With `dry_run` the same statements run and are rolled back, so the returned
+    counts are exactly what a real run would change. The courses are copied first; the students'
+    `UPDATE` and the new courses' `updated_at` come last and share one timestamp taken right before
+    the commit, so however long the copying takes, the change feed only has to wait for those final
+    statements.
+    """
+    summary = {'dry_run': dry_run, 'students_promoted': 0, 'courses_created': 0, 'classes': {}, 'semesters': {}}
+    try:
+        with ExitStack() as stack:
+            for alias in shard_aliases():
+                stack.enter_context(transaction.atomic(using=alias))
+            created = {alias: _create_courses(alias, class_map, semester_map, departments, user, summary)
+                       for alias in shard_aliases()}
+            now = timezone.now()
+            for alias in shard_aliases():
+                _promote_students(alias, class_map, departments, now, summary)
+                _stamp_courses(alias, created[alias], now)
+            if dry_run:
+                raise _DryRun
+    except _DryRun:
+        pass
+    else:
+        # The UPDATE bypasses model signals, so the caches would not hear about the new classes.
+        roster_cache.clear()
+        forget_dashboards()
+    return summary
+
+
+def _promote_students(alias, class_map, departments, now, summary):
+    if not class_map:
+        return
+    students = Student.objects.using(alias).filter(class_name__in=class_map)
+    if departments is not None:
+        students = students.filter(department_id__in=departments)
+    for row in students.values('class_name').annotate(count=Count('id')).order_by():
+        summary['classes'][row['class_name']] = summary['classes'].get(row['class_name'], 0) + row['count']
+    summary['students_promoted'] += students.update(
+        class_name=Case(*(When(class_name=old, then=Value(new)) for old, new in class_map.items()),
+                        default=F('class_name'), output_field=CharField()),
+        updated_at=now,
+    )
+
+
+def _create_courses(alias, class_map, semester_map, departments, user, summary):
+    """Copy the mapped semesters' courses on `alias` and return the ids of the new ones."""
+    if not semester_map:
+        return []
+    courses = Course.objects.using(alias).filter(semester__in=semester_map)
+    existing = Course.objects.using(alias).filter(semester__in=set(semester_map.values()))
+    if departments is not None:
+        courses = courses.filter(department_id__in=departments)
+        existing = existing.filter(department_id__in=departments)
+    existing = set(existing.values_list('department_id', 'course_name', 'semester', 'class_name'))
+
+    new_courses = []
+    for course in courses.values('department_id', 'course_name', 'semester', 'class_name', 'lecture_hours'):
+        semester = semester_map[course['semester']]
+        class_name = class_map.get(course['class_name'], course['class_name'])
+        key = (course['department_id'], course['course_name'], semester, class_name)
+        if key in existing:
+            continue
+        existing.add(key)
+        new_courses.append(Course(course_name=course['course_name'], department_id=course['department_id'],
+                                  semester=semester, class_name=class_name, lecture_hours=course['lecture_hours'],
+                                  submitted_by=user))
+        summary['semesters'][course['semester']] = summary['semesters'].get(course['semester'], 0) + 1
+    Course.objects.using(alias).bulk_create(new_courses, batch_size=1000)
+    summary['courses_created'] += len(new_courses)
+    return [course.pk for course in new_courses]
+
+
+def _stamp_courses(alias, course_ids, now):
+    for start in range(0, len(course_ids), 1000):
+        Course.objects.using(alias).filter(pk__in=course_ids[start:start + 1000]).update(updated_at=now)
@@ -0,0 +1,98 @@
+import threading
+import time
+
+from django.conf import settings
+
+from .models import Course, Student
+from .sharding import for_department, locate, shard_for_department
+
+
+class RosterCache:
+    """
+    Per-process cache of class rosters used to validate attendance writes without queries.
+
+    Courses map to (department, class_name) and each (department, class_name) maps its student ids
+    to the ids of their own logins. Both are loaded lazily on first use, dropped by the `Student`/`Course` signal handlers
+    in this process, and expire after `ROSTER_CACHE_TTL` seconds so changes made by other processes
+    are picked up too. Call `clear` after bulk updates that bypass model signals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._courses = {}
+        self._classes = {}
+
+    def ttl(self):
+        return getattr(settings, 'ROSTER_CACHE_TTL', 300)
+
+    def _get(self, store, key):
+        with self._lock:
+            entry = store.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def _put(self, store, key, value):
+        with self._lock:
+            store[key] = (value, time.monotonic() + self.ttl())
+
+    def course(self, course_id):
+        """Return the course with only id, department and class loaded, or None if it does not exist."""
+        info = self._get(self._courses, course_id)
+        if info is None:
+            try:
+                course = locate(Course.objects.only('id', 'department', 'class_name'), course_id)
+            except Course.DoesNotExist:
+                return None
+            info = (course.department_id, course.class_name, course._state.db)
+            self._put(self._courses, course_id, info)
+        return self._instance(Course, course_id, *info)
+
+    def class_students(self, department_id, class_name):
+        key = (department_id, class_name)
+        students = self._get(self._classes, key)
+        if students is None:
+            students = dict(for_department(Student.objects.all(), department_id)
+                            .filter(department_id=department_id, class_name=class_name)
+                            .values_list('id', 'user_id'))
+            self._put(self._classes, key, students)
+        return students
+
+    def enrolled_student(self, course, student_id):
+        """Return a `Student` for `student_id` if the student belongs to the course's class, else None."""
+        if student_id not in self.class_students(course.department_id, course.class_name):
+            return None
+        return self._instance(Student, student_id, course.department_id, course.class_name,
+                              shard_for_department(course.department_id))
+
+    def student_for_user(self, course, user_id):
+        """Return the `Student` whose login is `user_id` if that student belongs to the course's class, else None."""
+        for student_id, student_user_id in self.class_students(course.department_id, course.class_name).items():
+            if student_user_id == user_id:
+                return self.enrolled_student(course, student_id)
+        return None
+
+    @staticmethod
+    def _instance(model, pk, department_id, class_name, alias):
+        # Built like a `.only()` query result: the remaining fields are deferred and load on access.
+        return model.from_db(alias, ['id', 'department_id', 'class_name'], [pk, department_id, class_name])
+
+    def forget_course(self, course_id):
+        with self._lock:
+            self._courses.pop(course_id, None)
+
+    def forget_student(self, student_id):
+        with self._lock:
+            self._classes = {key: value for key, value in self._classes.items() if student_id not in value[0]}
+
+    def forget_class(self, department_id, class_name):
+        with self._lock:
+            self._classes.pop((department_id, class_name), None)
+
+    def clear(self):
+        with self._lock:
+            self._courses.clear()
+            self._classes.clear()
+
+
+roster_cache = RosterCache()
@@ -1,8 +1,92 @@
 from rest_framework import serializers
 from .models import *
+from .roster import roster_cache
 
 
-class UserSerializers(serializers.ModelSerializer):
+class RosterCourseField(serializers.PrimaryKeyRelatedField):
+    """Course primary key resolved through the roster cache instead of a query per write."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            course = roster_cache.course(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if course is None:
+            self.fail('does_not_exist', pk_value=data)
+        return course
+
+
+class RosterStudentField(serializers.PrimaryKeyRelatedField):
+    """Student primary key; `AttendanceSerializer.validate` checks it against the course's class roster."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin for sparse fieldsets.
+
+    The output is limited by `fields` / `exclude` (lists of field names) passed to the serializer or,
+    failing that, by the comma separated `?fields=` / `?exclude=` query parameters of the request in
+    the serializer context. `project` applies the same selection to a queryset with `.only()` so the
+    unrequested columns are not read either.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields, exclude = kwargs.pop('fields', None), kwargs.pop('exclude', None)
+        super().__init__(*args, **kwargs)
+        if fields is None and exclude is None:
+            fields, exclude = self.requested_fields(self.context.get('request'))
+        for name in self.unselected_fields(self.fields, fields, exclude):
+            self.fields.pop(name)
+
+    @staticmethod
+    def requested_fields(request):
+        if request is None:
+            return None, None
+        params = getattr(request, 'query_params', request.GET)
+
+        def split(name):
+            value = params.get(name)
+            return [field.strip() for field in value.split(',') if field.strip()] if value else None
+
+        return split('fields'), split('exclude')
+
+    @staticmethod
+    def unselected_fields(declared, fields, exclude):
+        unselected = set()
+        if fields is not None:
+            unselected |= set(declared) - set(fields)
+        if exclude is not None:
+            unselected |= set(declared) & set(exclude)
+        return unselected
+
+    @classmethod
+    def project(cls, queryset, request=None, fields=None, exclude=None):
+        """Defer the columns of `queryset` that the selected fields do not need."""
+        if fields is None and exclude is None:
+            fields, exclude = cls.requested_fields(request)
+        if fields is None and exclude is None:
+            return queryset
+        declared = cls(fields=None, exclude=()).fields
+        selected = [field for name, field in declared.items()
+                    if name not in cls.unselected_fields(declared, fields, exclude) and not field.write_only]
+        columns = {field.name for field in queryset.model._meta.concrete_fields}
+        sources = {field.source.split('.')[0] for field in selected}
+        if not sources <= columns:
+            return queryset
+        return queryset.only(queryset.model._meta.pk.name, *sources)
+
+
+class UserSerializers(SparseFieldsetMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=False)
 
     class Meta:
@@ -18,26 +102,44 @@ class UserSerializers(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class DepartmentSerializer(serializers.ModelSerializer):
+class DepartmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Department
         fields = ['id', 'department_name', 'submitted_by', 'updated_at']
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Course
         fields = ['id', 'course_name', 'department', 'semester', 'class_name', 'lecture_hours', 'submitted_by',
                   'updated_at']
 
 
-class StudentSerializer(serializers.ModelSerializer):
+class StudentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Student
-        fields = ['id', 'full_name', 'department', 'class_name', 'submitted_by', 'updated_at']
+        fields = ['id', 'full_name', 'department', 'class_name', 'user', 'submitted_by', 'updated_at']
 
 
-class AttendanceSerializer(serializers.ModelSerializer):
+class AttendanceSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    student = RosterStudentField(queryset=Student.objects.all())
+    course = RosterCourseField(queryset=Course.objects.all())
+
     class Meta:
         model = Attendance
         fields = ['id', 'student', 'course', 'present', 'submitted_by', 'updated_at']
+
+    def validate(self, attrs):
+        if 'student' in attrs and 'course' in attrs:
+            student = roster_cache.enrolled_student(attrs['course'], attrs['student'])
+            if student is None:
+                raise serializers.ValidationError({'student': "Student is not enrolled in the course's class."})
+            attrs['student'] = student
+        return attrs
+
+
+class AttendanceJournalSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = AttendanceJournal
+        fields = ['id', 'attendance_id', 'student_id', 'course_id', 'action', 'old_present', 'new_present',
+                  'changed_by_id', 'changed_at']
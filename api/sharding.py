@@ -0,0 +1,208 @@
+import heapq
+import time
+
+from django.conf import settings
+from django.db import connections, models
+
+SHARDED_MODELS = ('student', 'course', 'attendance')
+REFERENCE_MODELS = ('user', 'department')
+
+_shard_map = {}
+
+
+def shard_aliases():
+    """Database aliases that hold department data, in shard-index order."""
+    return list(getattr(settings, 'SHARD_DATABASES', ['default']))
+
+
+def is_sharded():
+    return len(shard_aliases()) > 1
+
+
+def shard_id_span():
+    return getattr(settings, 'SHARD_ID_SPAN', 10 ** 12)
+
+
+def shard_for_department(department_id):
+    """
+    Return the database alias holding a department's students, courses and attendance.
+
+    The mapping is persisted in `Department.shard` on the default database and cached per process
+    for `SHARD_MAP_TTL` seconds; signal handlers drop entries when a department is saved or deleted.
+    """
+    if not is_sharded() or department_id is None:
+        return 'default'
+    entry = _shard_map.get(department_id)
+    if entry is None or entry[1] < time.monotonic():
+        from .models import Department
+        alias = (Department.objects.using('default').filter(pk=department_id)
+                 .values_list('shard', flat=True).first()) or 'default'
+        entry = (alias, time.monotonic() + getattr(settings, 'SHARD_MAP_TTL', 60))
+        _shard_map[department_id] = entry
+    return entry[0]
+
+
+def forget_department(department_id):
+    _shard_map.pop(department_id, None)
+
+
+def department_id_for_instance(instance):
+    model_name = instance._meta.model_name
+    if model_name in ('student', 'course'):
+        return instance.department_id
+    if model_name == 'attendance':
+        for field in ('course', 'student'):
+            related = instance._meta.get_field(field).get_cached_value(instance, None)
+            if related is not None:
+                return related.department_id
+    return None
+
+
+def home_shard_for_pk(pk):
+    """Shard that allocated `pk`, derived from the per-shard id ranges set by `init_shards`."""
+    aliases = shard_aliases()
+    try:
+        index = int(pk) // shard_id_span()
+    except (TypeError, ValueError):
+        return aliases[0]
+    return aliases[index] if index < len(aliases) else aliases[0]
+
+
+def locate(queryset, pk):
+    """
+    Fetch a single row of a sharded model by primary key.
+
+    The row's home shard is tried first; rows moved by `move_department` are found by falling back
+    to the remaining shards. Raises `queryset.model.DoesNotExist` when no shard has the row.
+    """
+    home = home_shard_for_pk(pk)
+    for alias in [home] + [alias for alias in shard_aliases() if alias != home]:
+        instance = queryset.using(alias).filter(pk=pk).first()
+        if instance is not None:
+            return instance
+    raise queryset.model.DoesNotExist(f"{queryset.model.__name__} {pk} does not exist on any shard.")
+
+
+def for_department(queryset, department_id):
+    """Route a single-department query to the shard that owns the department."""
+    return queryset.using(shard_for_department(department_id))
+
+
+def fan_out(queryset, key=None):
+    """
+    Evaluate `queryset` on every shard and merge the results.
+
+    With a single shard the queryset is returned untouched. Otherwise each shard is read with the
+    queryset's ordering (primary key by default) and the already-sorted streams are merged, so the
+    combined list keeps that order without re-sorting everything in memory.
+    """
+    if not is_sharded():
+        return queryset
+    if not queryset.ordered:
+        queryset = queryset.order_by('pk')
+    if key is None:
+        key = _ordering_key(queryset)
+    return list(heapq.merge(*(queryset.using(alias).iterator() for alias in shard_aliases()), key=key))
+
+
+def _ordering_key(queryset):
+    ordering = queryset.query.order_by or ['pk']
+
+    def value(item, field):
+        return item[field] if isinstance(item, dict) else getattr(item, field)
+
+    def key(item):
+        return tuple(_Reversed(value(item, field[1:])) if field.startswith('-') else value(item, field)
+                     for field in ordering)
+
+    return key
+
+
+class _Reversed:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def reset_id_range(alias, model):
+    """Start the primary key sequence of `model` on shard `alias` at that shard's id range."""
+    start = shard_aliases().index(alias) * shard_id_span()
+    table = model._meta.db_table
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, start])
+            elif row[0] < start:
+                cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [start, table])
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                           f"GREATEST(%s, (SELECT COALESCE(MAX(id), 1) FROM {connection.ops.quote_name(table)})))",
+                           [table, max(start, 1)])
+
+
+class ShardedQuerySet(models.QuerySet):
+    """QuerySet whose `create` lets the router pick the shard from the new instance itself."""
+
+    def create(self, **kwargs):
+        if self._db is not None or not is_sharded():
+            return super().create(**kwargs)
+        instance = self.model(**kwargs)
+        self._for_write = True
+        instance.save(force_insert=True)
+        return instance
+
+
+class DepartmentShardRouter:
+    """
+    Route students, courses and attendance to their department's shard.
+
+    Users and departments are reference tables: they are written to `default` and replicated to
+    every shard by the handlers in `api.signals`, so foreign keys stay valid inside each shard.
+    Queries without an instance hint go to `default`; use `for_department`, `locate` or `fan_out`
+    to reach the other shards.
+    """
+
+    def _db_for_instance(self, model, **hints):
+        if not is_sharded() or model._meta.app_label != 'api':
+            return None
+        model_name = model._meta.model_name
+        if model_name in REFERENCE_MODELS:
+            return 'default'
+        if model_name not in SHARDED_MODELS:
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if instance._meta.model_name == 'department':
+            return shard_for_department(instance.pk)
+        if instance._meta.model_name in SHARDED_MODELS:
+            if instance._state.db and not instance._state.adding:
+                return instance._state.db
+            department_id = department_id_for_instance(instance)
+            if department_id is not None:
+                return shard_for_department(department_id)
+            return instance._state.db
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._db_for_instance(model, **hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for_instance(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._state.db == obj2._state.db:
+            return True
+        if {obj1._meta.model_name, obj2._meta.model_name} & set(REFERENCE_MODELS):
+            return True
+        return None
@@ -0,0 +1,93 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .changes import record_tombstone
+from .dashboard import forget_attendance_dashboard, forget_dashboards
+from .models import Attendance, Course, Department, Student, User
+from .journal import journal, journal_saved_attendance
+from .push import publish_attendance
+from .roster import roster_cache
+from .sharding import forget_department, is_sharded, shard_aliases
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Department)
+def replicate_reference_row(sender, instance, using, raw=False, **kwargs):
+    """Copy users and departments written to `default` onto every other shard."""
+    if sender is Department:
+        forget_department(instance.pk)
+    if raw or using != 'default' or not is_sharded():
+        return
+    for alias in shard_aliases():
+        if alias != 'default':
+            instance.save_base(using=alias, raw=True)
+    instance._state.db = using
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Department)
+def delete_reference_row(sender, instance, using, **kwargs):
+    if sender is Department:
+        forget_department(instance.pk)
+    if using != 'default' or not is_sharded():
+        return
+    for alias in shard_aliases():
+        if alias != 'default':
+            sender.objects.using(alias).filter(pk=instance.pk).delete()
+
+
+@receiver(post_delete, sender=Department)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Attendance)
+def leave_tombstone(sender, instance, using, **kwargs):
+    """Record deletes for the change feed; replicated department copies on other shards are skipped."""
+    if sender is Department and using != 'default':
+        return
+    record_tombstone(sender, instance.pk)
+
+
+@receiver(post_save, sender=Attendance)
+def push_attendance(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: publish_attendance(instance), using=using)
+
+
+@receiver(post_save, sender=Attendance)
+def journal_attendance(sender, instance, created, using, raw=False, **kwargs):
+    if raw:
+        return
+    entry = journal_saved_attendance(instance, created)
+    if entry is not None:
+        transaction.on_commit(lambda: journal.enqueue(entry), using=using)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def refresh_student_roster(sender, instance, **kwargs):
+    roster_cache.forget_student(instance.pk)
+    roster_cache.forget_class(instance.department_id, instance.class_name)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def refresh_course_roster(sender, instance, **kwargs):
+    roster_cache.forget_course(instance.pk)
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def refresh_attendance_dashboard(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: forget_attendance_dashboard(instance.course_id), using=using)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def refresh_dashboards(sender, instance, using, raw=False, **kwargs):
+    # A student or course may have left its old class, which the instance no longer tells us.
+    if not raw:
+        transaction.on_commit(forget_dashboards, using=using)
@@ -1,3 +1,1136 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import io
+import json
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+import warnings
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import connection, connections, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import archive, maintenance, middleware, sharding
+from . import rollover as rollover_module
+from .admin import AttendanceAdminForm, EstimatedCountPaginator
+from .changes import InvalidCursor, decode_cursor, encode_cursor
+from .checkin import InvalidCheckinToken, checkin_buffer, issue_token, verify_token, window_seconds
+from .checks import check_change_feed_lag
+from .dashboard import build_dashboard, class_dashboard, forget_dashboard
+from .journal import journal
+from .management.commands.sqlite_maintenance import Command as SqliteMaintenanceCommand
+from .middleware import AdmissionControlMiddleware, CompressionMiddleware, admission_state, negotiate_encoding
+from .models import *
+from .profiling import ProfilingMiddleware, capture_path
+from .push import InProcessBroker
+from .renderers import CBORParser, MessagePackParser, cbor2, columnar, msgpack
+from .rollover import rollover
+from .roster import roster_cache
+from .serializers import DepartmentSerializer, UserSerializers
+from .sharding import fan_out, home_shard_for_pk, locate, shard_aliases, shard_for_department, shard_id_span
+from .throttling import TokenBucketThrottle
+
+class FixtureMixin:
+    """Helpers for the rows most tests start from; `department` defaults to `self.department`."""
+
+    def create_superuser(self):
+        return User.objects.create_superuser(email='admin@example.com', password='secret', username='admin',
+                                             full_name='Admin')
+
+    def create_course(self, course_name='Algorithms', department=None, class_name='A', semester=1):
+        return Course.objects.create(course_name=course_name, department=department or self.department,
+                                     semester=semester, class_name=class_name, lecture_hours=3)
+
+    def create_student(self, full_name, department=None, class_name='A', **fields):
+        return Student.objects.create(full_name=full_name, department=department or self.department,
+                                      class_name=class_name, **fields)
+
+    def patch(self, target, attribute, *new):
+        patcher = mock.patch.object(target, attribute, *new)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def mark(self, course, student, present, day):
+        """Write a mark and date it at 09:00 on `day`."""
+        attendance = Attendance.objects.create(student=student, course=course, present=present)
+        Attendance.objects.filter(pk=attendance.pk).update(
+            updated_at=timezone.make_aware(datetime.datetime.combine(day, datetime.time(9))))
+        return attendance
+
+
+class ClassTestCase(FixtureMixin, TestCase):
+    """A superuser's API client and a department with one course and `student_count` students, all of class A."""
+    student_count = 3
+
+    def setUp(self):
+        cache.clear()
+        roster_cache.clear()
+        # Batched writes are flushed by hand instead of from the background threads.
+        for batcher in (journal, checkin_buffer):
+            self.patch(batcher, '_ensure_flusher')
+            self.patch(batcher, '_pending', [])
+        self.user = self.create_superuser()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.department = Department.objects.create(department_name='Computer Science')
+        self.course = self.create_course()
+        self.students = [self.create_student(f'Student {i}') for i in range(self.student_count)]
+
+
+@override_settings(SHARD_DATABASES=['default', 'shard_1'])
+class ShardedTestCase(FixtureMixin, TransactionTestCase):
+    """Runs its tests against `default` plus `shard_1`, prepared by `init_shards` as on a fresh deployment."""
+    databases = {'default', 'shard_1'}
+
+    def setUp(self):
+        sharding._shard_map.clear()
+        call_command('init_shards', verbosity=0, stdout=mock.MagicMock())
+        self.user = self.create_superuser()
+        self.home = self.department = Department.objects.create(department_name='Computer Science')
+        self.away = Department.objects.create(department_name='Electrical', shard='shard_1')
+
+    def tearDown(self):
+        sharding._shard_map.clear()
+
+
+class ShardRoutingTests(ShardedTestCase):
+
+    def test_reference_rows_are_replicated(self):
+        self.assertTrue(User.objects.using('shard_1').filter(pk=self.user.pk).exists())
+        self.assertTrue(Department.objects.using('shard_1').filter(pk=self.away.pk).exists())
+
+    def test_department_rows_are_written_to_their_shard(self):
+        course = self.create_course('Circuits', self.away)
+        student = self.create_student('Ada', self.away)
+        Attendance.objects.create(student=student, course=course, present=True)
+
+        self.assertEqual(shard_for_department(self.away.pk), 'shard_1')
+        self.assertEqual(shard_for_department(self.home.pk), 'default')
+        for model in (Course, Student, Attendance):
+            self.assertEqual(model.objects.using('shard_1').count(), 1)
+            self.assertFalse(model.objects.using('default').exists())
+
+    def test_locate_uses_the_home_shard_of_the_id(self):
+        student = self.create_student('Ada', self.away)
+        self.assertEqual(home_shard_for_pk(student.pk), 'shard_1')
+        self.assertEqual(locate(Student.objects.all(), student.pk), student)
+        with self.assertRaises(Student.DoesNotExist):
+            locate(Student.objects.all(), student.pk + 1)
+
+    def test_fan_out_merges_shards_in_query_order(self):
+        for name, department in (('Delta', self.home), ('Alpha', self.away), ('Charlie', self.home),
+                                 ('Bravo', self.away)):
+            self.create_student(name, department)
+
+        by_pk = fan_out(Student.objects.all())
+        self.assertEqual([student.pk for student in by_pk], sorted(student.pk for student in by_pk))
+        self.assertEqual({home_shard_for_pk(student.pk) for student in by_pk}, {'default', 'shard_1'})
+
+        by_name = fan_out(Student.objects.order_by('full_name').values('full_name'))
+        self.assertEqual([row['full_name'] for row in by_name], ['Alpha', 'Bravo', 'Charlie', 'Delta'])
+        descending = fan_out(Student.objects.order_by('-full_name').values('full_name'))
+        self.assertEqual([row['full_name'] for row in descending], ['Delta', 'Charlie', 'Bravo', 'Alpha'])
+
+
+class SqliteMaintenanceTests(TransactionTestCase):
+    """Maintenance of `shard_1`, the test database that lives in a file."""
+    databases = {'default', 'shard_1'}
+
+    def setUp(self):
+        backup_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, backup_dir, True)
+        overrides = override_settings(SQLITE_BACKUP_DIR=Path(backup_dir), SQLITE_BACKUP_KEEP=2,
+                                      SQLITE_VACUUM_SLEEP=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.shard = connections['shard_1']
+
+    def execute(self, sql, params=()):
+        with self.shard.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def fill_and_drop_a_table(self, rows=2000):
+        self.execute('CREATE TABLE scratch (data TEXT)')
+        with transaction.atomic(using='shard_1'), self.shard.cursor() as cursor:
+            cursor.executemany('INSERT INTO scratch VALUES (%s)', [('x' * 500,)] * rows)
+        self.execute('DROP TABLE scratch')
+
+    def test_backup_is_a_consistent_copy(self):
+        Department.objects.using('shard_1').create(department_name='Physics')
+        paths = [maintenance.backup('shard_1') for _ in range(3)]
+        self.assertEqual(sorted(maintenance.backup_dir().joinpath('shard_1').iterdir()), paths[1:])
+        copy = sqlite3.connect(paths[-1])
+        try:
+            self.assertEqual(copy.execute('SELECT department_name FROM api_department').fetchall(), [('Physics',)])
+        finally:
+            copy.close()
+
+    def test_incremental_vacuum_frees_pages_in_steps(self):
+        maintenance.enable_incremental_vacuum('shard_1')
+        self.fill_and_drop_a_table()
+        free = maintenance.database_stats('shard_1')['freelist_count']
+        self.assertGreater(free, 100)
+        # Past its deadline it does not start.
+        self.assertEqual(maintenance.incremental_vacuum('shard_1', deadline=time.monotonic()), 0)
+        with override_settings(SQLITE_VACUUM_STEP_PAGES=100):
+            with mock.patch.object(maintenance.time, 'sleep') as sleep:
+                self.assertEqual(maintenance.incremental_vacuum('shard_1'), free)
+        self.assertGreaterEqual(sleep.call_count, free // 100)
+        self.assertEqual(maintenance.database_stats('shard_1')['freelist_count'], 0)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('sqlite_maintenance', '--database', 'shard_1', '--force', stdout=out)
+        output = out.getvalue()
+        self.assertIn("'shard_1': backed up to", output)
+        self.assertIn("planner statistics refreshed (analyze)", output)
+        self.assertTrue(maintenance.database_stats('shard_1')['analyzed'])
+
+        out = io.StringIO()
+        with override_settings(SQLITE_MAINTENANCE_WINDOW=(0, 0)):
+            call_command('sqlite_maintenance', '--database', 'shard_1', '--optimize', '--json', stdout=out)
+        skipped, stats = out.getvalue().splitlines()
+        self.assertIn('outside the quiet window', skipped)
+        self.assertEqual(json.loads(stats)['database'], 'shard_1')
+
+        # The test `default` database is in memory, so there is nothing to maintain.
+        with self.assertRaises(CommandError):
+            call_command('sqlite_maintenance', '--database', 'default', stdout=out)
+
+
+class SqliteMaintenanceLoopTests(TestCase):
+
+    class Stop(Exception):
+        pass
+
+    def loop(self, start, iterations, *args):
+        """Run `--loop` on a fake clock; return the local time and the tasks of each round."""
+        clock = [timezone.make_aware(start)]
+        rounds = []
+
+        def run(command, aliases, tasks, force, as_json):
+            rounds.append((timezone.localtime(clock[0]).strftime('%d %H:%M'), sorted(tasks)))
+
+        def sleep(seconds):
+            if len(rounds) == iterations:
+                raise self.Stop
+            clock[0] += timedelta(seconds=seconds)
+
+        with mock.patch('django.utils.timezone.now', lambda: clock[0]), \
+                mock.patch.object(SqliteMaintenanceCommand, 'run', run), \
+                mock.patch('api.management.commands.sqlite_maintenance.time.sleep', sleep):
+            with self.assertRaises(self.Stop):
+                call_command('sqlite_maintenance', '--loop', '--database', 'shard_1', *args, stdout=io.StringIO())
+        return rounds
+
+    @override_settings(SQLITE_MAINTENANCE_WINDOW=(2, 5), SQLITE_MAINTENANCE_INTERVAL=6 * 60 * 60)
+    def test_loop_wakes_up_when_the_quiet_window_opens(self):
+        # Every six hours from 23:00 would be 05:00, 11:00, 17:00: never inside 02:00-05:00.
+        self.assertEqual(self.loop(datetime.datetime(2024, 3, 4, 23), 6), [
+            ('04 23:00', ['backup']),
+            ('05 02:00', ['optimize', 'vacuum']),
+            ('05 05:00', ['backup']),
+            ('05 11:00', ['backup']),
+            ('05 17:00', ['backup']),
+            ('05 23:00', ['backup']),
+        ])
+
+    @override_settings(SQLITE_MAINTENANCE_WINDOW=(22, 3), SQLITE_MAINTENANCE_INTERVAL=60 * 60)
+    def test_window_across_midnight_runs_once(self):
+        rounds = self.loop(datetime.datetime(2024, 3, 4, 21, 30), 7, '--optimize')
+        self.assertEqual([when for when, tasks in rounds if tasks], ['04 22:00'])
+        self.assertEqual([when for when, tasks in rounds], ['04 21:30', '04 22:00', '04 22:30', '04 23:30',
+                                                            '05 00:30', '05 01:30', '05 02:30'])
+
+
+class ShardedAdminTests(ShardedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.course = self.create_course('Circuits', self.away)
+        self.student = self.create_student('Ada Lovelace', self.away)
+        self.attendance = Attendance.objects.create(student=self.student, course=self.course, present=True)
+
+    def test_changelists_list_the_chosen_shard(self):
+        self.assertNotContains(self.client.get('/admin/api/student/'), 'Ada Lovelace')
+        self.assertContains(self.client.get('/admin/api/student/', {'shard': 'shard_1'}), 'Ada Lovelace')
+        self.assertRedirects(self.client.get('/admin/api/student/', {'shard': 'nowhere'}),
+                             '/admin/api/student/?e=1', fetch_redirect_response=False)
+
+    def test_change_forms_find_rows_on_any_shard(self):
+        url = f'/admin/api/attendance/{self.attendance.pk}/change/'
+        response = self.client.get(url)
+        self.assertContains(response, 'shard=shard_1')
+        response = self.client.post(url, {'student': self.student.pk, 'course': self.course.pk, 'present': ''})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Attendance.objects.using('shard_1').get(pk=self.attendance.pk).present)
+        self.assertEqual(self.client.get(f'/admin/api/student/{self.student.pk + 1}/change/').status_code, 302)
+
+
+class InitShardsTests(ShardedTestCase):
+
+    def test_each_shard_allocates_ids_from_its_own_range(self):
+        for index, alias in enumerate(shard_aliases()):
+            department = self.home if alias == 'default' else self.away
+            course = self.create_course('Maths', department)
+            self.assertGreater(course.pk, index * shard_id_span())
+            self.assertLess(course.pk, (index + 1) * shard_id_span())
+            self.assertEqual(course._state.db, alias)
+
+    def test_running_again_keeps_allocated_ids(self):
+        first = self.create_student('Ada', self.away)
+        call_command('init_shards', verbosity=0, stdout=mock.MagicMock())
+        second = self.create_student('Grace', self.away)
+        self.assertEqual(second.pk, first.pk + 1)
+
+    def test_default_must_come_first(self):
+        with override_settings(SHARD_DATABASES=['shard_1', 'default']):
+            with self.assertRaises(CommandError):
+                call_command('init_shards', verbosity=0, stdout=mock.MagicMock())
+
+
+class MoveDepartmentTests(ShardedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.course = self.create_course()
+        self.students = [self.create_student(f'Student {i}') for i in range(5)]
+        for student in self.students:
+            Attendance.objects.create(student=student, course=self.course, present=True)
+
+    def move(self, department=None, target='shard_1'):
+        call_command('move_department', (department or self.home).pk, target, batch_size=2,
+                     stdout=mock.MagicMock())
+
+    def assertMoved(self):
+        self.assertEqual(Department.objects.get(pk=self.home.pk).shard, 'shard_1')
+        self.assertEqual(shard_for_department(self.home.pk), 'shard_1')
+        for model, count in ((Course, 1), (Student, 5), (Attendance, 5)):
+            self.assertEqual(model.objects.using('shard_1').count(), count)
+            self.assertFalse(model.objects.using('default').exists())
+        # Moved rows keep their ids, so they are still found from their old home shard.
+        self.assertEqual(locate(Student.objects.all(), self.students[0].pk), self.students[0])
+
+    def test_move(self):
+        self.move()
+        self.assertMoved()
+        new = self.create_student('Grace')
+        self.assertEqual(home_shard_for_pk(new.pk), 'shard_1')
+
+    def test_rerun_after_failing_before_the_shard_map_flip(self):
+        with mock.patch.object(Department, 'save', side_effect=RuntimeError('crashed')):
+            with self.assertRaises(RuntimeError):
+                self.move()
+        # The copy committed but the department still reads from its old shard.
+        self.assertEqual(Department.objects.get(pk=self.home.pk).shard, 'default')
+        self.assertEqual(Attendance.objects.using('default').count(), 5)
+        self.assertEqual(Attendance.objects.using('shard_1').count(), 5)
+
+        self.move()
+        self.assertMoved()
+
+    def test_rerun_after_failing_before_the_delete(self):
+        with mock.patch('django.db.models.query.QuerySet.delete', side_effect=RuntimeError('crashed')):
+            with self.assertRaises(RuntimeError):
+                self.move()
+        # The department already reads from its new shard; the re-run removes the old copies.
+        self.assertEqual(Department.objects.get(pk=self.home.pk).shard, 'shard_1')
+        self.assertEqual(Attendance.objects.using('default').count(), 5)
+
+        self.move()
+        self.assertMoved()
+
+    def test_sqlite_refuses_to_move_into_a_lower_id_range(self):
+        self.create_student('Ada', self.away)
+        with self.assertRaises(CommandError):
+            self.move(self.away, 'default')
+        self.assertEqual(Student.objects.using('shard_1').filter(department=self.away).count(), 1)
+
+
+class ChangeFeedTests(ClassTestCase):
+    student_count = 5
+
+    def feed(self, cursor=None, **params):
+        if cursor:
+            params['cursor'] = cursor
+        return self.client.get('/api/changes/', params)
+
+    def sync(self, cursor=None, limit=2):
+        """Follow `has_more` to the end and return the changed ids per resource and the last cursor."""
+        seen = {}
+        while True:
+            data = self.feed(cursor, limit=limit).data
+            for resource, rows in data['data'].items():
+                seen.setdefault(resource, []).extend(row['id'] for row in rows)
+            cursor = data['cursor']
+            if not data['has_more']:
+                return seen, data
+
+    def test_cursor_round_trip(self):
+        moment = timezone.now()
+        positions = {'students': (moment, 7), 'deleted': (moment - timedelta(days=1), 0)}
+        self.assertEqual(decode_cursor(encode_cursor(positions)), positions)
+        for cursor in ('junk', encode_cursor({'teachers': (moment, 1)}), 'eyJzdHVkZW50cyI6WyJ4IiwxXX0='):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+        self.assertEqual(self.feed('junk').status_code, 400)
+
+    @override_settings(CHANGE_FEED_LAG=0)
+    def test_pages_cover_every_row_once(self):
+        seen, data = self.sync()
+        self.assertEqual(sorted(seen['students']), [student.pk for student in self.students])
+        self.assertEqual(seen['courses'], [self.course.pk])
+        self.assertEqual(seen['departments'], [self.department.pk])
+
+        self.students[1].full_name = 'Renamed'
+        self.students[1].save()
+        seen, data = self.sync(data['cursor'])
+        self.assertEqual(seen['students'], [self.students[1].pk])
+        self.assertEqual(seen['courses'], [])
+
+    def test_rows_inside_the_lag_wait_for_the_next_call(self):
+        now = timezone.now()
+        with mock.patch('api.changes.timezone.now', return_value=now):
+            seen, data = self.sync()
+        self.assertEqual(seen['students'], [])
+
+        # Stamped before that call but committed after it: still within the lag, so it is not lost.
+        late = self.create_student('Late')
+        Student.objects.filter(pk=late.pk).update(updated_at=now - timedelta(seconds=20))
+        with mock.patch('api.changes.timezone.now', return_value=now + timedelta(seconds=31)):
+            seen = self.sync(data['cursor'])[0]
+        self.assertIn(late.pk, seen['students'])
+
+    @override_settings(CHANGE_FEED_LAG=0)
+    def test_deletes_are_sent_as_tombstones(self):
+        cursor = self.sync()[1]['cursor']
+        deleted = self.students[0].pk
+        self.students[0].delete()
+        data = self.feed(cursor).data
+        self.assertEqual(data['deleted'], {'students': [deleted]})
+        self.assertEqual(self.feed(data['cursor']).data['deleted'], {})
+
+    @override_settings(CHANGE_FEED_LAG=0)
+    def test_cursor_older_than_the_retention_must_resync(self):
+        cursor = self.sync()[1]['cursor']
+        with override_settings(CHANGE_FEED_RETENTION_DAYS=-1):
+            response = self.feed(cursor)
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.data['resync'])
+        self.assertEqual(self.feed().status_code, 200)
+
+    def test_lag_must_cover_lock_waits_and_long_writes(self):
+        self.assertEqual(check_change_feed_lag(None), [])
+        with override_settings(CHANGE_FEED_LAG=2):
+            self.assertEqual([error.id for error in check_change_feed_lag(None)], ['api.E001'])
+
+
+class RolloverTests(ClassTestCase):
+    student_count = 2
+
+    def setUp(self):
+        super().setUp()
+        self.second_year = self.create_student('Grace', class_name='B')
+        self.create_course('Databases', class_name='B')
+
+    def post(self, body):
+        return self.client.post('/api/rollover/', body, format='json')
+
+    def classes(self):
+        return sorted(Student.objects.values_list('full_name', 'class_name'))
+
+    def test_chained_classes_are_promoted_once(self):
+        response = self.post({'classes': {'A': 'B', 'B': 'C'}, 'semesters': {'1': 3}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['classes'], {'A': 2, 'B': 1})
+        self.assertEqual(self.classes(), [('Grace', 'C'), ('Student 0', 'B'), ('Student 1', 'B')])
+        self.assertEqual(sorted(Course.objects.filter(semester=3).values_list('course_name', 'class_name')),
+                         [('Algorithms', 'B'), ('Databases', 'C')])
+
+    def test_courses_that_already_exist_are_skipped(self):
+        self.create_course('Algorithms', class_name='B', semester=3)
+        response = self.post({'classes': {'A': 'B', 'B': 'C'}, 'semesters': {'1': 3}})
+        self.assertEqual((response.data['data']['courses_created'], response.data['data']['semesters']),
+                         (1, {1: 1}))
+        self.assertEqual(Course.objects.filter(semester=3).count(), 2)
+        # Running it again (e.g. after a failed attempt) creates nothing twice.
+        response = self.post({'classes': {'A': 'B', 'B': 'C'}, 'semesters': {'1': 3}})
+        self.assertEqual(response.data['data']['courses_created'], 0)
+
+    def test_dry_run_rolls_everything_back(self):
+        before = self.classes(), Course.objects.count()
+        response = self.post({'classes': {'A': 'B'}, 'semesters': {'1': 3}, 'dry_run': True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['data']['students_promoted'], response.data['data']['courses_created']), (2, 2))
+        self.assertEqual((self.classes(), Course.objects.count()), before)
+        # "false" is a boolean false, not a truthy string.
+        self.post({'classes': {'A': 'B'}, 'dry_run': 'false'})
+        self.assertEqual(Student.objects.filter(class_name='B').count(), 3)
+
+    def test_invalid_requests(self):
+        for body in ([{'classes': {'A': 'B'}}], 'A', {'classes': {'A': 'B'}, 'dry_run': 'maybe'},
+                     {'classes': ['A']}, {}):
+            self.assertEqual(self.post(body).status_code, 400, body)
+        self.assertEqual(self.classes()[0], ('Grace', 'B'))
+
+    @override_settings(CHANGE_FEED_MAX_WRITE_SECONDS=0)
+    def test_rows_are_stamped_after_the_courses_are_copied(self):
+        create_courses = rollover_module._create_courses
+        copied = []
+
+        def slow_create_courses(*args):
+            created = create_courses(*args)
+            copied.append(timezone.now())
+            return created
+
+        with mock.patch.object(rollover_module, '_create_courses', slow_create_courses):
+            summary = rollover({'A': 'B'}, {1: 3})
+        self.assertEqual((summary['students_promoted'], summary['courses_created']), (2, 2))
+        stamps = [*Student.objects.filter(class_name='B').exclude(pk=self.second_year.pk)
+                  .values_list('updated_at', flat=True),
+                  *Course.objects.filter(semester=3).values_list('updated_at', flat=True)]
+        self.assertEqual(len(set(stamps)), 1)
+        self.assertGreaterEqual(stamps[0], copied[-1])
+
+
+class CheckinTests(ClassTestCase):
+    student_count = 1
+
+    def setUp(self):
+        super().setUp()
+        self.account = User.objects.create_user(email='ada@example.com', password='secret', username='ada',
+                                                full_name='Ada', type='student')
+        self.student = self.create_student('Ada', user=self.account)
+        self.classmate = self.students[0]
+        self.client.force_authenticate(self.account)
+        self.patch(checkin_buffer, '_seen', {})
+
+    def check_in(self, token=None, **data):
+        return self.client.post('/api/checkin/', {'token': token or issue_token(self.course)[0], **data},
+                                format='json')
+
+    def test_token_round_trip(self):
+        now = 1_000_000.0
+        token, expires = issue_token(self.course, now=now)
+        self.assertGreater(expires, now)
+        self.assertEqual(verify_token(token, now=now), (self.course.pk, self.department.pk))
+        # Accepted for one more window after its own, then rejected.
+        self.assertEqual(verify_token(token, now=expires), (self.course.pk, self.department.pk))
+        with self.assertRaisesMessage(InvalidCheckinToken, 'expired'):
+            verify_token(token, now=expires + window_seconds())
+        with self.assertRaisesMessage(InvalidCheckinToken, 'Invalid'):
+            verify_token(token.replace(f'{self.course.pk}.', f'{self.course.pk + 1}.', 1), now=now)
+        self.assertEqual(self.check_in('not-a-token').status_code, 400)
+
+    def test_body_must_be_an_object(self):
+        token = issue_token(self.course)[0]
+        for body in ([token], token, {'token': [token]}):
+            self.assertEqual(self.client.post('/api/checkin/', body, format='json').status_code, 400, body)
+        self.assertEqual(checkin_buffer.flush(), 0)
+
+    def test_students_check_in_themselves_once(self):
+        self.assertEqual(self.check_in(student=self.classmate.pk).status_code, 202)
+        self.assertEqual(self.check_in().status_code, 200)
+        self.assertEqual(checkin_buffer.flush(), 1)
+        # The body's student id is not trusted: the check-in belongs to the caller's own record.
+        self.assertEqual(list(Attendance.objects.values_list('student_id', 'present')), [(self.student.pk, True)])
+
+    def test_already_present_students_are_not_written_again(self):
+        Attendance.objects.create(student=self.student, course=self.course, present=True)
+        self.assertEqual(self.check_in().status_code, 202)
+        self.assertEqual(checkin_buffer.flush(), 0)
+        self.assertEqual(Attendance.objects.count(), 1)
+
+    def test_only_enrolled_student_accounts_can_check_in(self):
+        self.student.class_name = 'B'
+        self.student.save()
+        self.assertEqual(self.check_in().status_code, 400)
+
+        teacher = User.objects.create_user(email='teacher@example.com', password='secret', username='teacher',
+                                           full_name='Teacher', type='teacher')
+        self.client.force_authenticate(teacher)
+        self.assertEqual(self.check_in().status_code, 403)
+
+        unlinked = User.objects.create_user(email='alan@example.com', password='secret', username='alan',
+                                            full_name='Alan', type='student')
+        self.client.force_authenticate(unlinked)
+        self.assertEqual(self.check_in().status_code, 400)
+        self.assertEqual(checkin_buffer.flush(), 0)
+
+
+@override_settings(ADMISSION_MAX_CONCURRENT_WRITES=1, ADMISSION_MAX_QUEUED=1, ADMISSION_RETRY_AFTER=3)
+class AdmissionControlTests(ClassTestCase):
+    student_count = 0
+
+    def setUp(self):
+        super().setUp()
+        self.patch(middleware, '_active', None)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.requests = RequestFactory()
+
+    def respond(self, request):
+        if request.path == '/slow/':
+            self.release.wait(5)
+        return HttpResponse('ok')
+
+    def admission(self, queue_timeout):
+        with override_settings(ADMISSION_QUEUE_TIMEOUT=queue_timeout):
+            return AdmissionControlMiddleware(self.respond)
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_writes_queue_for_a_free_slot(self):
+        admission = self.admission(queue_timeout=5)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            slow = pool.submit(admission, self.requests.post('/slow/'))
+            self.wait_for(lambda: admission_state()['in_flight_writes'] == 1)
+            queued = pool.submit(admission, self.requests.post('/fast/'))
+            self.wait_for(lambda: admission_state()['queued_writes'] == 1)
+            # The queue is full, so the next write is shed without waiting; reads are never held back.
+            self.assertEqual(admission(self.requests.post('/fast/')).status_code, 503)
+            self.assertEqual(admission(self.requests.get('/fast/')).status_code, 200)
+            self.release.set()
+            self.assertEqual((slow.result().status_code, queued.result().status_code), (200, 200))
+        self.assertEqual(admission_state(), {'in_flight_writes': 0, 'queued_writes': 0})
+
+    def test_writes_past_the_queue_deadline_are_shed(self):
+        admission = self.admission(queue_timeout=0.05)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            slow = pool.submit(admission, self.requests.post('/slow/'))
+            self.wait_for(lambda: admission_state()['in_flight_writes'] == 1)
+            started = time.monotonic()
+            response = admission(self.requests.post('/fast/'))
+            self.assertGreaterEqual(time.monotonic() - started, 0.05)
+            self.release.set()
+            slow.result()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+        self.assertEqual(self.client.get('/api/metrics/load/').data['data']['shed'], 1)
+
+
+class EstimatedCountPaginatorTests(ClassTestCase):
+    student_count = 5
+
+    def count(self, queryset=None):
+        return EstimatedCountPaginator(queryset if queryset is not None else Student.objects.all(), 100).count
+
+    def test_estimate_uses_the_analyzed_row_count(self):
+        Student.objects.filter(pk__in=[student.pk for student in self.students[1:4]]).delete()
+        # Never analyzed: the id span still counts the deleted rows.
+        self.assertEqual(self.count(), 5)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(self.count(), 2)
+        self.assertEqual(self.count(Student.objects.filter(full_name='Student 0')), 1)
+
+
+class AttendanceStreamTests(ClassTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.marks = [Attendance.objects.create(student=student, course=self.course, present=True)
+                      for student in self.students]
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    async def open_stream(self):
+        response = await self.async_client.get('/api/attendance/stream/', {'course': self.course.pk},
+                                               headers={'Authorization': f'Bearer {self.token}'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        self.assertTrue((await anext(events)).startswith(b'event: subscribed'))
+        return events
+
+    def mark_absent_in_admin(self, marks):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/admin/api/attendance/', {
+                'action': 'mark_absent', '_selected_action': [attendance.pk for attendance in marks]})
+        self.assertEqual(response.status_code, 302)
+
+    async def test_admin_bulk_marks_are_pushed(self):
+        events = await self.open_stream()
+        await sync_to_async(self.mark_absent_in_admin)(self.marks[:2])
+        received = [await anext(events) for _ in range(2)]
+        self.assertTrue(all(event.startswith(b'event: attendance') for event in received))
+        self.assertEqual(sorted(json.loads(event.split(b'data: ', 1)[1])['id'] for event in received),
+                         [attendance.pk for attendance in self.marks[:2]])
+        self.assertNotIn(b'"present": true', b''.join(received))
+
+    async def test_lagging_subscriber_is_told_to_resync(self):
+        with mock.patch('api.push._broker', InProcessBroker(max_pending=1)):
+            events = await self.open_stream()
+            await sync_to_async(self.mark_absent_in_admin)(self.marks)
+            self.assertTrue((await anext(events)).startswith(b'event: attendance'))
+            self.assertTrue((await anext(events)).startswith(b'event: resync'))
+            with self.assertRaises(StopAsyncIteration):
+                await anext(events)
+
+
+class TokenBucketThrottleTests(TestCase):
+
+    class Throttle(TokenBucketThrottle):
+        rate = '10/min'
+
+        def get_cache_key(self, request, view):
+            return 'throttle_test'
+
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_requests_do_not_overspend_the_bucket(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            allowed = list(pool.map(lambda _: self.Throttle().allow_request(None, None), range(40)))
+        self.assertLessEqual(allowed.count(True), 10)
+        self.assertFalse(self.Throttle().allow_request(None, None))
+
+    def test_bucket_refills_at_the_sustained_rate(self):
+        throttle = self.Throttle()
+        with mock.patch.object(self.Throttle, 'timer', return_value=1000.0):
+            self.assertEqual([throttle.allow_request(None, None) for _ in range(11)], [True] * 10 + [False])
+            self.assertAlmostEqual(throttle.wait(), 6.0)
+        with mock.patch.object(self.Throttle, 'timer', return_value=1006.0):
+            self.assertEqual([throttle.allow_request(None, None) for _ in range(2)], [True, False])
+
+    def test_busy_bucket_throttles_instead_of_racing(self):
+        cache.add('throttle_test:lock', True, 1)
+        self.assertFalse(self.Throttle().allow_request(None, None))
+
+
+@override_settings(ARCHIVE_DIR=tempfile.mkdtemp())
+class ArchiveTests(ClassTestCase):
+    student_count = 1
+
+    def setUp(self):
+        super().setUp()
+        self.courses = [self.course, self.create_course('Databases')]
+        # Two segments per course: one in March and one in April.
+        for course in self.courses:
+            for day in (datetime.date(2024, 3, 1), datetime.date(2024, 3, 2), datetime.date(2024, 4, 1),
+                        datetime.date(2024, 4, 2)):
+                self.mark(course, self.students[0], True, day)
+        call_command('archive_attendance', '2024-spring', '--before', '2024-07-01', '--batch-size', '2',
+                     stdout=mock.MagicMock())
+
+    def read(self, start=None, end=None, course=None):
+        with mock.patch.object(archive, 'read_segment', wraps=archive.read_segment) as read_segment:
+            rows = archive.archived_attendance(start, end, course=course)
+        return rows, read_segment.call_count
+
+    def test_segments_record_their_range_and_courses(self):
+        manifest = AttendanceArchive.objects.get()
+        self.assertEqual(manifest.segments, 4)
+        self.assertEqual([stats['courses'] for stats in manifest.segment_stats],
+                         [[course.pk] for course in self.courses for _ in range(2)])
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_reads_skip_segments_that_cannot_match(self):
+        rows, reads = self.read()
+        self.assertEqual((len(rows), reads), (8, 4))
+
+        april = archive.parse_range_bound('2024-04-01'), archive.parse_range_bound('2024-04-30', end=True)
+        rows, reads = self.read(*april)
+        self.assertEqual((len(rows), reads), (4, 2))
+        rows, reads = self.read(*april, course=self.courses[1].pk)
+        self.assertEqual((len(rows), reads), (2, 1))
+
+    def test_segments_without_stats_are_still_read(self):
+        AttendanceArchive.objects.update(segment_stats=[])
+        rows, reads = self.read(course=self.courses[1].pk)
+        self.assertEqual((len(rows), reads), (4, 4))
+
+
+class AttendanceRosterTests(ClassTestCase):
+    student_count = 1
+
+    def setUp(self):
+        super().setUp()
+        self.enrolled = self.students[0]
+        self.other_class = self.create_student('Grace', class_name='B')
+
+    def test_api_rejects_students_outside_the_class(self):
+        response = self.client.post('/api/attendance/', {'student': self.other_class.pk, 'course': self.course.pk,
+                                                         'present': True}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('student', response.data['message'])
+        response = self.client.post('/api/attendance/', {'student': self.enrolled.pk, 'course': self.course.pk,
+                                                         'present': True}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_admin_form_rejects_students_outside_the_class(self):
+        form = AttendanceAdminForm({'student': self.other_class.pk, 'course': self.course.pk, 'present': True})
+        self.assertFalse(form.is_valid())
+        self.assertIn('student', form.errors)
+        form = AttendanceAdminForm({'student': self.enrolled.pk, 'course': self.course.pk, 'present': True})
+        self.assertTrue(form.is_valid(), form.errors)
+
+
+class DashboardTests(ClassTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.courses = [self.course, self.create_course('Databases')]
+        self.create_student('Other class', class_name='B')
+
+    def test_latest_lecture_of_each_course(self):
+        monday, tuesday = datetime.date(2024, 3, 4), datetime.date(2024, 3, 5)
+        for student in self.students:
+            self.mark(self.courses[0], student, True, monday)
+        self.mark(self.courses[0], self.students[0], False, tuesday)
+        self.mark(self.courses[0], self.students[1], True, tuesday)
+        self.mark(self.courses[1], self.students[2], False, monday)
+
+        with self.assertNumQueries(5):
+            dashboard = build_dashboard(self.department, 'A', 1)
+        algorithms, databases = dashboard['courses']
+        self.assertEqual((algorithms['present'], algorithms['absent']), (4, 1))
+        self.assertEqual(algorithms['latest_lecture'], {'date': '2024-03-05', 'present': 1, 'absent': 1,
+                                                        'marks': {str(self.students[0].pk): False,
+                                                                  str(self.students[1].pk): True}})
+        self.assertEqual(databases['latest_lecture'], {'date': '2024-03-04', 'present': 0, 'absent': 1,
+                                                       'marks': {str(self.students[2].pk): False}})
+        self.assertEqual([student['attendance_rate'] for student in dashboard['students']], [0.5, 1.0, 0.5])
+
+    def test_courses_without_attendance(self):
+        dashboard = build_dashboard(self.department, 'A', 1)
+        self.assertEqual(dashboard['courses'][0]['latest_lecture'], {'date': None, 'present': 0, 'absent': 0,
+                                                                     'marks': {}})
+
+    def test_cache_keys_accept_any_class_name(self):
+        class_name = 'Year 2 \u2013 evening group'
+        self.create_course('Networks', class_name=class_name)
+        student = self.create_student('Night owl', class_name=class_name)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            self.assertEqual(len(class_dashboard(self.department, class_name, 1)['students']), 1)
+            with self.assertNumQueries(0):
+                class_dashboard(self.department, class_name, 1)
+            student.delete()
+            forget_dashboard(self.department.pk, class_name)
+            self.assertEqual(class_dashboard(self.department, class_name, 1)['students'], [])
+
+
+class WireFormatTests(ClassTestCase):
+    student_count = 20
+
+    def setUp(self):
+        super().setUp()
+        self.requests = RequestFactory()
+
+    def test_encoding_negotiation(self):
+        encodings = dict.fromkeys(('zstd', 'br', 'gzip'))
+        for accept_encoding, coding in (('gzip, br', 'br'), ('gzip;q=1, br;q=0.5', 'gzip'), ('*', 'zstd'),
+                                        ('zstd;q=0, *;q=0.1', 'br'), ('GZIP', 'gzip'), ('identity', None),
+                                        ('gzip;q=0', None), ('', None)):
+            self.assertEqual(negotiate_encoding(accept_encoding, encodings), coding, accept_encoding)
+
+    def test_api_responses_are_compressed_but_html_pages_are_not(self):
+        response = self.client.get('/api/student/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(len(json.loads(zlib.decompress(response.content, 31))['data']), 20)
+
+        self.client.force_login(self.user)
+        response = self.client.get('/admin/api/student/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get('/api/student/', HTTP_ACCEPT='text/html', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streams_are_compressed_chunk_by_chunk(self):
+        events = [f'event: attendance\ndata: {{"id": {i}}}\n\n'.encode() for i in range(3)]
+        compress = CompressionMiddleware(lambda request: StreamingHttpResponse(
+            iter(events), content_type='text/event-stream'))
+        response = compress(self.requests.get('/stream/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        decompressor = zlib.decompressobj(31)
+        # Every chunk is flushed, so each event can be decoded as soon as it arrives.
+        received = [decompressor.decompress(chunk) for chunk in response.streaming_content]
+        self.assertEqual(received[:3], events)
+        self.assertTrue(decompressor.eof)
+
+    async def test_async_streams_are_compressed_chunk_by_chunk(self):
+        async def stream():
+            yield b'event: subscribed\ndata: {}\n\n'
+
+        compress = CompressionMiddleware(lambda request: StreamingHttpResponse(
+            stream(), content_type='text/event-stream'))
+        response = compress(self.requests.get('/stream/', HTTP_ACCEPT_ENCODING='gzip'))
+        decompressor = zlib.decompressobj(31)
+        received = [decompressor.decompress(chunk) async for chunk in response.streaming_content]
+        self.assertEqual(received[0], b'event: subscribed\ndata: {}\n\n')
+
+    def test_columnar_layout(self):
+        response = self.client.get('/api/student/', {'fields': 'id,full_name'},
+                                   HTTP_ACCEPT='application/json; layout=columnar')
+        data = response.json()['data']
+        self.assertEqual(data['columns'], ['id', 'full_name'])
+        self.assertEqual(data['rows'][0], [self.students[0].pk, 'Student 0'])
+        # Rows that do not share their keys keep the usual layout.
+        mixed = {'data': [{'id': 1}, {'id': 2, 'name': 'x'}]}
+        self.assertIs(columnar(mixed), mixed)
+
+    @unittest.skipUnless(msgpack, "needs the msgpack package")
+    def test_msgpack_bodies(self):
+        response = self.client.post('/api/departments/', msgpack.packb({'department_name': 'Physics'}),
+                                    content_type='application/msgpack', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertTrue(msgpack.unpackb(response.content)['success'])
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(io.BytesIO(b'\xc1'))
+
+    @unittest.skipUnless(cbor2, "needs the cbor2 package")
+    def test_cbor_bodies(self):
+        response = self.client.post('/api/departments/', cbor2.dumps({'department_name': 'Physics'}),
+                                    content_type='application/cbor', HTTP_ACCEPT='application/cbor')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(cbor2.loads(response.content)['success'])
+        with self.assertRaises(ParseError):
+            CBORParser().parse(io.BytesIO(b'\xff\xff'))
+
+
+class ProfilingTests(ClassTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.profile_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.profile_dir, True)
+        overrides = override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.profile_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def profiled_get(self, user=None, path='/api/student/'):
+        token = RefreshToken.for_user(user or self.user).access_token
+        return self.client.get(path, HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def captures(self):
+        return sorted(path.name for path in self.profile_dir.iterdir())
+
+    def test_middleware_is_not_installed_when_disabled(self):
+        with override_settings(PROFILING_ENABLED=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(lambda request: HttpResponse())
+
+    def test_staff_requests_are_captured(self):
+        self.assertEqual(self.profiled_get().status_code, 200)
+        capture_id, = self.captures()
+        self.assertEqual(sorted(path.name for path in capture_path(capture_id).iterdir()),
+                         ['meta.json', 'profile.pstats', 'stacks.folded'])
+        summary, = self.client.get('/api/profiles/').data['data']
+        self.assertEqual((summary['id'], summary['path'], summary['status']), (capture_id, '/api/student/', 200))
+        self.assertGreater(summary['query_count'], 0)
+        self.assertNotIn('queries', summary)
+        response = self.client.get(f'/api/profiles/{capture_id}/stacks/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'get (views.py:', b''.join(response.streaming_content))
+
+    def test_other_requests_are_not_captured(self):
+        student = User.objects.create_user(email='ada@example.com', password='secret', username='ada',
+                                           full_name='Ada', type='student')
+        self.assertEqual(self.profiled_get(student).status_code, 200)
+        self.assertEqual(self.client.get('/api/student/', HTTP_X_PROFILE='1').status_code, 200)
+        self.assertEqual(self.client.get('/api/student/').status_code, 200)
+        self.assertEqual(self.captures(), [])
+
+    @override_settings(PROFILING_MAX_CAPTURES=2)
+    def test_only_the_newest_captures_are_kept(self):
+        for _ in range(3):
+            self.profiled_get()
+        self.assertEqual(len(self.captures()), 2)
+
+    def test_downloads_only_serve_capture_files(self):
+        self.profiled_get()
+        capture_id, = self.captures()
+        for capture, kind in (('..', 'meta'), ('20261019T101500', 'meta'), ('20261019T101500-1f2e3d4c', 'meta'),
+                              (capture_id, 'settings'), (f'{capture_id}x', 'meta')):
+            self.assertEqual(self.client.get(f'/api/profiles/{capture}/{kind}/').status_code, 404, (capture, kind))
+        self.assertIsNone(capture_path('../../etc'))
+
+
+class AttendanceJournalTests(ClassTestCase):
+    student_count = 2
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def journaled(self, write):
+        """Run `write` and return the journal entries it added as (attendance, action, old, new, changed by)."""
+        AttendanceJournal.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        journal.flush()
+        return list(AttendanceJournal.objects.order_by('id').values_list(
+            'attendance_id', 'action', 'old_present', 'new_present', 'changed_by_id'))
+
+    def test_created_and_changed_marks_are_journaled(self):
+        attendance = Attendance(student=self.students[0], course=self.course, present=True, submitted_by=self.user)
+        self.assertEqual(self.journaled(attendance.save), [(attendance.pk, 1, None, True, self.user.pk)])
+        attendance = Attendance.objects.get(pk=attendance.pk)
+        attendance.present = False
+        self.assertEqual(self.journaled(attendance.save), [(attendance.pk, 2, True, False, self.user.pk)])
+
+    def test_saving_an_unchanged_mark_is_not_journaled(self):
+        attendance = Attendance.objects.create(student=self.students[0], course=self.course, present=True)
+        self.assertEqual(self.journaled(Attendance.objects.get(pk=attendance.pk).save), [])
+        self.assertEqual(self.journaled(Attendance.objects.only('id').get(pk=attendance.pk).save), [])
+
+    def test_mark_assigned_while_deferred_journals_the_stored_value(self):
+        attendance = Attendance.objects.create(student=self.students[0], course=self.course, present=True)
+        deferred = Attendance.objects.only('id').get(pk=attendance.pk)
+        deferred.present = False
+        self.assertEqual(self.journaled(deferred.save), [(attendance.pk, 2, True, False, None)])
+        # Read after loading: the deferred value is fetched on access and remembered.
+        deferred = Attendance.objects.only('id').get(pk=attendance.pk)
+        self.assertFalse(deferred.present)
+        deferred.present = True
+        self.assertEqual(self.journaled(deferred.save), [(attendance.pk, 2, False, True, None)])
+
+    def test_admin_bulk_marks_are_journaled(self):
+        marks = [Attendance.objects.create(student=student, course=self.course, present=present)
+                 for student, present in zip(self.students, (True, False))]
+        entries = self.journaled(lambda: self.client.post('/admin/api/attendance/', {
+            'action': 'mark_absent', '_selected_action': [attendance.pk for attendance in marks]}))
+        self.assertEqual(entries, [(marks[0].pk, 2, True, False, self.user.pk)])
+
+    def test_history_lists_the_changes_newest_first(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            attendance = Attendance.objects.create(student=self.students[0], course=self.course, present=True)
+            attendance.present = False
+            attendance.save()
+            Attendance.objects.create(student=self.students[1], course=self.course, present=True)
+        response = self.client.get('/api/attendance/history/', {'student': self.students[0].pk})
+        self.assertEqual([(row['attendance_id'], row['action'], row['old_present'], row['new_present'])
+                          for row in response.data['data']], [(attendance.pk, 2, True, False),
+                                                              (attendance.pk, 1, None, True)])
+        self.assertEqual(len(self.client.get('/api/attendance/history/', {'course': self.course.pk,
+                                                                           'limit': 1}).data['data']), 1)
+        for params in ({}, {'student': 'x'}):
+            self.assertEqual(self.client.get('/api/attendance/history/', params).status_code, 400, params)
+
+
+class IdempotencyTests(ClassTestCase):
+
+    def post(self, department_name='Physics', key='retry-1'):
+        return self.client.post('/api/departments/', {'department_name': department_name}, format='json',
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_stored_response(self):
+        first, retry = self.post(), self.post()
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.data, first.data)
+        self.assertNotIn('Idempotent-Replayed', first)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Department.objects.filter(department_name='Physics').count(), 1)
+        # A new key is a new request.
+        self.assertEqual(self.post(key='retry-2').status_code, 201)
+
+    def test_key_reused_with_another_payload_is_rejected(self):
+        self.post()
+        self.assertEqual(self.post('Chemistry').status_code, 422)
+        self.assertFalse(Department.objects.filter(department_name='Chemistry').exists())
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_retry_while_the_first_request_runs_conflicts(self):
+        digest = hashlib.sha256(b'retry-1').hexdigest()
+        cache.add(f'idempotency:{self.user.pk}:{digest}:lock', True, 30)
+        self.assertEqual(self.post().status_code, 409)
+        self.assertFalse(Department.objects.filter(department_name='Physics').exists())
+
+    def test_server_errors_are_not_stored(self):
+        with mock.patch.object(DepartmentSerializer, 'save', side_effect=RuntimeError('database is locked')):
+            self.assertEqual(self.post().status_code, 500)
+        retry = self.post()
+        self.assertEqual(retry.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', retry)
+
+
+class SparseFieldsetTests(ClassTestCase):
+    student_count = 2
+
+    def get(self, url, table, **params):
+        """Return the rows of a list response and the SELECTs it ran on `table`."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        selects = [query['sql'] for query in queries if query['sql'].startswith(f'SELECT "{table}".')]
+        self.assertEqual(len(selects), 1, selects)
+        return response.data['data'], selects[0]
+
+    def test_only_the_requested_columns_are_read(self):
+        rows, select = self.get('/api/student/', 'api_student', fields='id,full_name')
+        self.assertEqual([set(row) for row in rows], [{'id', 'full_name'}] * 2)
+        self.assertIn('"full_name"', select)
+        for column in ('class_name', 'department_id', 'user_id', 'updated_at'):
+            self.assertNotIn(f'"{column}"', select)
+
+    def test_excluded_columns_are_not_read(self):
+        rows, select = self.get('/api/student/', 'api_student', exclude='class_name,user')
+        self.assertNotIn('class_name', rows[0])
+        self.assertNotIn('"class_name"', select)
+        self.assertNotIn('"user_id"', select)
+        self.assertIn('"full_name"', select)
+
+    def test_many_to_many_fields_read_the_whole_row(self):
+        queryset = User.objects.all()
+        self.assertIs(UserSerializers.project(queryset, fields=['id', 'email', 'groups']), queryset)
+        rows, select = self.get('/api/user/user_list/', 'api_user', fields='id,groups')
+        self.assertEqual(set(rows[0]), {'id', 'groups'})
+        self.assertIn('"password"', select)
+        rows, select = self.get('/api/user/user_list/', 'api_user', fields='id,email')
+        self.assertNotIn('"password"', select)
+
+
+class MultiGetAndExpandTests(ClassTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for student in self.students:
+            Attendance.objects.create(student=student, course=self.course, present=True)
+
+    def test_ids(self):
+        ids = f'{self.students[0].pk},{self.students[2].pk}'
+        response = self.client.get('/api/student/', {'ids': ids})
+        self.assertEqual([row['id'] for row in response.data['data']], [self.students[0].pk, self.students[2].pk])
+        for url in ('/api/student/', '/api/course/', '/api/departments/', '/api/user/user_list/'):
+            self.assertEqual(self.client.get(url, {'ids': '1,x'}).status_code, 400, url)
+        with override_settings(MULTI_GET_MAX_IDS=2):
+            self.assertEqual(self.client.get('/api/student/', {'ids': '1,2,3'}).status_code, 400)
+
+    def test_expand(self):
+        response = self.client.get('/api/attendance/', {'expand': 'student,course.department'})
+        included = response.data['included']
+        self.assertEqual(sorted(included['students']), sorted(str(student.pk) for student in self.students))
+        self.assertEqual(list(included['departments']), [str(self.department.pk)])
+        response = self.client.get('/api/attendance/', {'expand': 'student', 'fields': 'id,student,present'})
+        self.assertEqual(len(response.data['included']['students']), 3)
+
+    def test_expand_needs_the_relation_in_the_rows(self):
+        for params in ({'expand': 'student', 'fields': 'id,present'}, {'expand': 'student', 'exclude': 'student'},
+                       {'expand': 'course.department', 'fields': 'id'}, {'expand': 'teacher'}):
+            self.assertEqual(self.client.get('/api/attendance/', params).status_code, 400, params)
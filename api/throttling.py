@@ -0,0 +1,81 @@
+import time
+
+from django.core.cache import cache
+from rest_framework.throttling import ScopedRateThrottle, SimpleRateThrottle, UserRateThrottle
+
+COUNTERS = ('throttled', 'shed')
+
+
+def incr_counter(name):
+    key = f'load:{name}'
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def load_counters():
+    values = cache.get_many([f'load:{name}' for name in COUNTERS])
+    return {name: values.get(f'load:{name}', 0) for name in COUNTERS}
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket variant of DRF's rate throttles.
+
+    A rate of `N/period` gives each client a bucket of N tokens refilled continuously at N per period,
+    so clients may burst up to N requests and are then smoothed to the sustained rate. Buckets live in
+    the throttle cache, shared by every process that uses the same cache backend.
+
+    Reading and writing a bucket happens under a per-bucket lock taken with `cache.add`, so concurrent
+    requests of one client cannot both spend the same token. A request that cannot get the lock within
+    `lock_wait` seconds is throttled; a lock left behind by a crashed process expires after `lock_timeout`.
+    """
+    lock_timeout = 1
+    lock_wait = 0.05
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        lock_key = f'{self.key}:lock'
+        if not self._acquire(lock_key):
+            self.tokens = 0
+            incr_counter('throttled')
+            return False
+        try:
+            self.now = self.timer()
+            tokens, stamp = self.cache.get(self.key, (self.num_requests, self.now))
+            self.tokens = min(self.num_requests, tokens + (self.now - stamp) * self.num_requests / self.duration)
+            if self.tokens < 1:
+                incr_counter('throttled')
+                return False
+            self.cache.set(self.key, (self.tokens - 1, self.now), self.duration)
+            return True
+        finally:
+            self.cache.delete(lock_key)
+
+    def _acquire(self, lock_key):
+        deadline = time.monotonic() + self.lock_wait
+        delay = 0.001
+        while not self.cache.add(lock_key, True, self.lock_timeout):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, 0.01)
+        return True
+
+    def wait(self):
+        return (1 - self.tokens) * self.duration / self.num_requests
+
+
+class UserTokenBucketThrottle(UserRateThrottle, TokenBucketThrottle):
+    """Per-user bucket (per IP address for anonymous requests), rate `user`."""
+
+
+class ScopedTokenBucketThrottle(ScopedRateThrottle, TokenBucketThrottle):
+    """Per-user bucket for each endpoint that sets `throttle_scope`."""
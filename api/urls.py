@@ -12,4 +12,15 @@ urlpatterns = [
     path('course/', views.CourseListCreateAPIView.as_view(), name='course-list-create'),
     path('student/', views.StudentListCreateAPIView.as_view(), name='student-list-create'),
     path('attendance/', views.AttendanceListCreateAPIView.as_view(), name='attendance-list-create'),
+    path('attendance/history/', views.AttendanceHistoryAPIView.as_view(), name='attendance-history'),
+    path('attendance/stream/', views.AttendanceStreamView.as_view(), name='attendance-stream'),
+    path('checkin/token/', views.CheckinTokenAPIView.as_view(), name='checkin-token'),
+    path('checkin/', views.CheckinAPIView.as_view(), name='checkin'),
+    path('dashboard/', views.ClassDashboardAPIView.as_view(), name='class-dashboard'),
+    path('rollover/', views.RolloverAPIView.as_view(), name='rollover'),
+    path('changes/', views.ChangeFeedAPIView.as_view(), name='change-feed'),
+    path('metrics/load/', views.LoadMetricsAPIView.as_view(), name='load-metrics'),
+    path('metrics/database/', views.DatabaseMetricsAPIView.as_view(), name='database-metrics'),
+    path('profiles/', views.ProfileListAPIView.as_view(), name='profile-list'),
+    path('profiles/<str:capture_id>/<str:kind>/', views.ProfileDownloadAPIView.as_view(), name='profile-download'),
 ]
@@ -1,21 +1,58 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
 from rest_framework import viewsets
 from rest_framework.views import Response
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.decorators import action
 from django.contrib.auth import authenticate
 from rest_framework.exceptions import AuthenticationFailed, PermissionDenied
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
 from .models import *
 from .serializers import *
+from .checkin import InvalidCheckinToken, checkin_buffer, issue_token, verify_token
+from .archive import archived_attendance, parse_range_bound
+from .idempotency import idempotent
+from .journal import journal
+from .maintenance import database_stats, sqlite_aliases
+from .middleware import admission_state
+from .profiling import CAPTURE_FILES, capture_path, list_captures
+from .rollover import RolloverError, parse_rollover, rollover
+from .roster import roster_cache
+from .throttling import load_counters
+from .changes import InvalidCursor, ResyncRequired, build_change_feed
+from .dashboard import class_dashboard
+from .expansion import InvalidExpansion, expand, parse_expand, parse_ids
+from .push import event_stream
+from .sharding import fan_out, locate
 
 
 # Create your views here.
 
 
+def requested_ids(request):
+    """
+    Parse the `?ids=` multi-get filter of `request`.
+
+    Returns `(ids, None)`, where ids is None when no filter was given, or `(None, response)` with the
+    400 response to send back when the filter is malformed or too long.
+    """
+    try:
+        return (parse_ids(request.query_params['ids']) if request.query_params.get('ids') else None), None
+    except ValueError:
+        return None, Response({'success': False, 'message': "ids must be a comma separated list of at most "
+                                                            f"{settings.MULTI_GET_MAX_IDS} ids."},
+                              status=status.HTTP_400_BAD_REQUEST)
+
+
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializers
+    throttle_scope = None
 
     @action(detail=False, methods=['post'])
     def register(self, request):
@@ -61,7 +98,7 @@ class UserViewSet(viewsets.ModelViewSet):
         except Exception as err:
             return Response({'success': False, 'error': err.args[0]})
 
-    @action(detail=False, methods=['post'], url_path='login')
+    @action(detail=False, methods=['post'], url_path='login', throttle_scope='login')
     def login(self, request):
         """
             Handles user login by authenticating the user with the provided email and password.
@@ -115,8 +152,16 @@ class UserViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def user_list(self, request):
-        queryset = User.objects.all()
-        serializer = UserSerializers(queryset, many=True).data
+        """
+            List users; `?fields=` / `?exclude=` (comma separated) limit the returned fields and the columns read,
+            and `?ids=1,2,3` returns only those users.
+            """
+        ids, error = requested_ids(request)
+        if error is not None:
+            return error
+        queryset = User.objects.filter(pk__in=ids) if ids is not None else User.objects.all()
+        queryset = UserSerializers.project(queryset, request)
+        serializer = UserSerializers(queryset, many=True, context={'request': request}).data
         return Response({'success': True, 'data': serializer}, status=status.HTTP_200_OK)
 
 
@@ -124,39 +169,48 @@ class DepartmentListCreateAPIView(APIView):
     permission_classes = (IsAuthenticated,)
 
     def get(self, request, *args, **kwargs):
-        def get(self, request, *args, **kwargs):
-            """
-            Handle GET requests to retrieve a list of departments.
+        """
+        Handle GET requests to retrieve a list of departments.
 
-            This method retrieves all the departments available in the database and returns them in a serialized format.
+        This method retrieves all the departments available in the database and returns them in a serialized format.
 
-            Returns:
-                Response: A JSON response containing a list of departments.
+        Query Parameters:
+            ids (str): Comma separated ids, e.g. `?ids=1,2,3`, to fetch only those departments.
+            fields (str): Comma separated fields to return, e.g. `?fields=id,department_name`.
+            exclude (str): Comma separated fields to leave out.
 
-            Example:
-                GET /departments/
+        Returns:
+            Response: A JSON response containing a list of departments.
 
-                Response:
-                [
-                       {
-                        "id": 1,
-                        "department_name": "Computer Science",
+        Example:
+            GET /departments/
+
+            Response:
+            [
+                   {
+                    "id": 1,
+                    "department_name": "Computer Science",
+                    "submitted_by": 5,
+                    "updated_at": "2024-08-13T10:20:35.071412+05:30"
+                    },
+                    {
+                        "id": 2,
+                        "department_name": "Electorics and Communications",
                         "submitted_by": 5,
-                        "updated_at": "2024-08-13T10:20:35.071412+05:30"
-                        },
-                        {
-                            "id": 2,
-                            "department_name": "Electorics and Communications",
-                            "submitted_by": 5,
-                            "updated_at": "2024-08-13T10:20:27.993879+05:30"
-                        }
-                    ...
-                ]
-            """
-            departments = Department.objects.all()
-            serializer = DepartmentSerializer(departments, many=True)
-            return Response({'success': True, 'data': serializer.data}, status=status.HTTP_200_OK)
+                        "updated_at": "2024-08-13T10:20:27.993879+05:30"
+                    }
+                ...
+            ]
+        """
+        ids, error = requested_ids(request)
+        if error is not None:
+            return error
+        departments = Department.objects.filter(pk__in=ids) if ids is not None else Department.objects.all()
+        departments = DepartmentSerializer.project(departments, request)
+        serializer = DepartmentSerializer(departments, many=True, context={'request': request})
+        return Response({'success': True, 'data': serializer.data}, status=status.HTTP_200_OK)
 
+    @idempotent
     def post(self, request, *args, **kwargs):
         """
         Handle POST requests to create a new department.
@@ -203,6 +257,11 @@ class CourseListCreateAPIView(APIView):
 
         This method retrieves all the courses available in the database and returns them in a serialized format.
 
+        Query Parameters:
+            ids (str): Comma separated ids, e.g. `?ids=1,2,3`, to fetch only those courses.
+            fields (str): Comma separated fields to return, e.g. `?fields=id,course_name`.
+            exclude (str): Comma separated fields to leave out.
+
         Returns:
             Response: A JSON response containing a list of courses with a success status.
 
@@ -241,10 +300,15 @@ class CourseListCreateAPIView(APIView):
                 ]
             }
         """
-        courses = Course.objects.all()
-        serializer = CourseSerializer(courses, many=True)
+        ids, error = requested_ids(request)
+        if error is not None:
+            return error
+        courses = Course.objects.filter(pk__in=ids) if ids is not None else Course.objects.all()
+        courses = fan_out(CourseSerializer.project(courses, request))
+        serializer = CourseSerializer(courses, many=True, context={'request': request})
         return Response({"success": True, 'data': serializer.data}, status=status.HTTP_200_OK)
 
+    @idempotent
     def post(self, request, *args, **kwargs):
         """
          Handle POST requests to create a new course.
@@ -304,6 +368,11 @@ class StudentListCreateAPIView(APIView):
 
             This method retrieves all the students from the database and returns their details in a serialized format.
 
+            Query Parameters:
+                ids (str): Comma separated ids, e.g. `?ids=1,2,3`, to fetch only those students.
+                fields (str): Comma separated fields to return, e.g. `?fields=id,full_name`.
+                exclude (str): Comma separated fields to leave out.
+
             Returns:
                 Response: A JSON response containing a list of student details with a success status.
 
@@ -339,10 +408,15 @@ class StudentListCreateAPIView(APIView):
                 }
             """
 
-        students = Student.objects.all()
-        serializer = StudentSerializer(students, many=True)
+        ids, error = requested_ids(request)
+        if error is not None:
+            return error
+        students = Student.objects.filter(pk__in=ids) if ids is not None else Student.objects.all()
+        students = fan_out(StudentSerializer.project(students, request))
+        serializer = StudentSerializer(students, many=True, context={'request': request})
         return Response({'success': True, 'data': serializer.data}, status=status.HTTP_200_OK)
 
+    @idempotent
     def post(self, request, *args, **kwargs):
         """
             Handle POST requests to create a new student.
@@ -392,6 +466,7 @@ class StudentListCreateAPIView(APIView):
 
 class AttendanceListCreateAPIView(APIView):
     permission_classes = (IsAuthenticated,)
+    throttle_scope = 'attendance'
 
     def get(self, request, *args, **kwargs):
         """
@@ -399,12 +474,28 @@ class AttendanceListCreateAPIView(APIView):
 
             This method retrieves all attendance records from the database and returns them in a serialized format.
 
+            Query Parameters:
+                fields (str): Comma separated fields to return, e.g. `?fields=id,student,present`.
+                exclude (str): Comma separated fields to leave out.
+                from (str): Only records updated on or after this date/datetime.
+                to (str): Only records updated up to this date (inclusive) or before this datetime.
+                course (int): Only records of this course.
+                student (int): Only records of this student.
+                expand (str): Comma separated relations to side-load, e.g. `?expand=student,course.department`.
+                    Each referenced object is returned once in `included`, keyed by resource and id. Expanded
+                    relations must be among the returned fields.
+
+            When `from` or `to` is given, records of archived terms in that range are read from the archive and
+            returned together with the current ones.
+
             Returns:
                 Response: A JSON response containing a list of attendance records with a success status.
 
             Response Structure:
                 success (bool): Indicates if the request was successful.
                 data (list): A list of serialized attendance objects.
+                included (dict): With `expand`, the referenced objects, e.g.
+                    `{"students": {"1": {...}}, "courses": {"1": {...}}, "departments": {"1": {...}}}`.
 
             Each attendance record in the list includes:
                 id (int): The unique identifier for the attendance record.
@@ -441,10 +532,45 @@ class AttendanceListCreateAPIView(APIView):
                 }
             """
 
-        attendances = Attendance.objects.all()
-        serializer = AttendanceSerializer(attendances, many=True)
-        return Response({'success': True, 'data': serializer.data}, status=status.HTTP_200_OK)
+        try:
+            params = request.query_params
+            start = parse_range_bound(params['from']) if params.get('from') else None
+            end = parse_range_bound(params['to'], end=True) if params.get('to') else None
+            course = int(params['course']) if params.get('course') else None
+            student = int(params['student']) if params.get('student') else None
+            tree = (parse_expand(Attendance, params['expand'], *AttendanceSerializer.requested_fields(request))
+                    if params.get('expand') else None)
+        except InvalidExpansion as err:
+            return Response({'success': False, 'message': str(err)}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({'success': False, 'message': "Invalid from, to, course or student filter."},
+                            status=status.HTTP_400_BAD_REQUEST)
 
+        queryset = Attendance.objects.all()
+        if start is not None:
+            queryset = queryset.filter(updated_at__gte=start)
+        if end is not None:
+            queryset = queryset.filter(updated_at__lt=end)
+        if course is not None:
+            queryset = queryset.filter(course_id=course)
+        if student is not None:
+            queryset = queryset.filter(student_id=student)
+        attendances = fan_out(AttendanceSerializer.project(queryset, request))
+        serializer = AttendanceSerializer(attendances, many=True, context={'request': request})
+        data = serializer.data
+
+        if start is not None or end is not None:
+            hot_ids = {attendance.pk for attendance in attendances}
+            fields = serializer.child.fields.keys()
+            archived = [{field: row[field] for field in fields}
+                        for row in archived_attendance(start, end, course, student) if row['id'] not in hot_ids]
+            data = archived + list(data)
+        if tree:
+            return Response({'success': True, 'data': data, 'included': expand(data, Attendance, tree)},
+                            status=status.HTTP_200_OK)
+        return Response({'success': True, 'data': data}, status=status.HTTP_200_OK)
+
+    @idempotent
     def post(self, request, *args, **kwargs):
         """
             Handle POST requests to register student attendance.
@@ -456,6 +582,9 @@ class AttendanceListCreateAPIView(APIView):
                 course_id (int): The ID of the course for which the attendance is being registered. This field is required.
                 present (bool): Indicates whether the student was present (true) or absent (false). This field is required.
 
+                A list of such objects registers a whole roll call in one request. The payload may be sent as
+                JSON or, when enabled, as MessagePack (`application/msgpack`) or CBOR (`application/cbor`).
+
             Returns:
                 Response: A JSON response indicating the success or failure of the attendance registration process.
 
@@ -483,11 +612,544 @@ class AttendanceListCreateAPIView(APIView):
             """
 
         try:
-            serializer = AttendanceSerializer(data=request.data)
-            if serializer.is_valid(raise_exception=True):
-                serializer.save(submitted_by=request.user)
-                return Response({'success': True, 'message': "Student Attendance has been register."},
-                                status=status.HTTP_201_CREATED)
+            serializer = AttendanceSerializer(data=request.data, many=isinstance(request.data, list))
+            serializer.is_valid(raise_exception=True)
+            serializer.save(submitted_by=request.user)
+            return Response({'success': True, 'message': "Student Attendance has been register."},
+                            status=status.HTTP_201_CREATED)
+        except serializers.ValidationError:
             return Response({'success': False, 'message': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as err:
             return Response({'detail': err.args[0]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ClassDashboardAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        """
+            Handle GET requests for the dashboard of one class in one semester.
+
+            Returns the class's courses, its roster, attendance counts per course and per student, and the marks
+            of each course's latest lecture in one response, built from a fixed number of queries and cached until
+            attendance of the class changes. The latest lecture is the last day any mark of the course was written:
+            attendance has no lecture date, so correcting an old mark makes that day the latest lecture, with only
+            the corrected marks in it, until the next roll call.
+
+            Query Parameters:
+                department (int): The ID of the department. This field is required.
+                class_name (str): The class. This field is required.
+                semester (int): The semester whose courses are shown. This field is required.
+
+            Returns:
+                Response: A JSON response with the department, courses and students of the class.
+
+            Raises:
+                HTTP_400_BAD_REQUEST: If a parameter is missing or invalid.
+                HTTP_404_NOT_FOUND: If the department does not exist.
+
+            Example:
+                GET /dashboard/?department=1&class_name=A&semester=3
+
+                Response:
+                {
+                    "success": True,
+                    "data": {
+                        "department": {"id": 1, "department_name": "Computer Science"},
+                        "class_name": "A",
+                        "semester": 3,
+                        "courses": [{"id": 4, "course_name": "Algorithms", "lecture_hours": 3, "present": 410,
+                                     "absent": 40, "attendance_rate": 0.9111,
+                                     "latest_lecture": {"date": "2026-10-19", "present": 28, "absent": 2,
+                                                        "marks": {"12": true, "13": false, ...}}}],
+                        "students": [{"id": 12, "full_name": "John Doe", "present": 40, "absent": 2,
+                                      "attendance_rate": 0.9524}]
+                    }
+                }
+            """
+        class_name = request.query_params.get('class_name')
+        try:
+            department_id = int(request.query_params.get('department'))
+            semester = int(request.query_params.get('semester'))
+        except (TypeError, ValueError):
+            department_id = semester = None
+        if department_id is None or not class_name:
+            return Response({'success': False, 'message': "Pass department, class_name and semester."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            department = Department.objects.get(pk=department_id)
+        except Department.DoesNotExist:
+            return Response({'success': False, 'message': "Department not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'success': True, 'data': class_dashboard(department, class_name, semester)},
+                        status=status.HTTP_200_OK)
+
+
+class RolloverAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        """
+            Handle POST requests to roll the school over into a new term.
+
+            Students of each mapped class are promoted to the new class, and the courses of each mapped
+            semester are copied into the next one (with their class renamed through the class mapping), using
+            set-based statements in a single transaction. Send `dry_run` first to preview the counts.
+
+            Payload:
+                classes (dict): Old class name -> new class name.
+                semesters (dict): Semester -> semester whose courses are created from it.
+                departments (list, optional): Only roll over these departments. Defaults to all.
+                dry_run (bool, optional): Compute the counts and roll everything back.
+
+            Returns:
+                Response: A JSON response with the number of promoted students and created courses, broken down
+                by old class and old semester.
+
+            Raises:
+                HTTP_400_BAD_REQUEST: If the body is not an object, or the mappings or `dry_run` are invalid.
+                HTTP_403_FORBIDDEN: If the user does not have staff permissions.
+                HTTP_500_INTERNAL_SERVER_ERROR: If an unexpected error occurs; nothing is changed.
+
+            Example:
+                POST /rollover/
+                {
+                    "classes": {"FY-A": "SY-A", "SY-A": "TY-A"},
+                    "semesters": {"1": 3, "2": 4},
+                    "dry_run": true
+                }
+
+                Response:
+                {
+                    "success": True,
+                    "data": {"dry_run": true, "students_promoted": 1200, "courses_created": 48,
+                             "classes": {"FY-A": 610, "SY-A": 590}, "semesters": {"1": 24, "2": 24}}
+                }
+            """
+        if not request.user.is_staff:
+            return Response({'detail': 'You do not have permission to perform this action.'},
+                            status=status.HTTP_403_FORBIDDEN)
+        if not isinstance(request.data, dict):
+            return Response({'success': False, 'message': "The request body must be an object."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            class_map, semester_map, departments = parse_rollover(request.data.get('classes'),
+                                                                  request.data.get('semesters'),
+                                                                  request.data.get('departments'))
+            dry_run = serializers.BooleanField().to_internal_value(request.data.get('dry_run', False))
+        except RolloverError as err:
+            return Response({'success': False, 'message': str(err)}, status=status.HTTP_400_BAD_REQUEST)
+        except serializers.ValidationError:
+            return Response({'success': False, 'message': "'dry_run' must be a boolean."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            summary = rollover(class_map, semester_map, departments, dry_run=dry_run, user=request.user)
+        except Exception as err:
+            return Response({'detail': err.args[0]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({'success': True, 'data': summary}, status=status.HTTP_200_OK)
+
+
+class ChangeFeedAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        """
+            Handle GET requests for the rows that changed since the client's last sync.
+
+            Query Parameters:
+                cursor (str): The opaque cursor returned by the previous call. Omit it for the first sync.
+                limit (int): The maximum number of rows returned per resource (default 500, max 1000).
+
+            Returns:
+                Response: A JSON response with the created/updated rows per resource and the ids of deleted rows.
+
+            Response Structure:
+                success (bool): Indicates if the request was successful.
+                data (dict): Changed `departments`, `courses`, `students` and `attendance` rows.
+                deleted (dict): Ids of deleted rows, keyed by resource.
+                cursor (str): The cursor to send with the next call.
+                has_more (bool): True if another call is needed to catch up.
+
+            Raises:
+                HTTP_400_BAD_REQUEST: If the cursor or limit is invalid.
+                HTTP_410_GONE: If the cursor is too old; the client must drop its cache and sync again without a cursor.
+
+            Example:
+                GET /changes/?cursor=eyJkZXBhcnRtZW50cyI6...
+
+                Response:
+                {
+                    "success": True,
+                    "data": {
+                        "departments": [],
+                        "courses": [],
+                        "students": [],
+                        "attendance": [
+                            {
+                                "id": 3,
+                                "student": 1,
+                                "course": 1,
+                                "present": true,
+                                "submitted_by": 5,
+                                "updated_at": "2024-08-13T10:25:02.118736+05:30"
+                            }
+                        ]
+                    },
+                    "deleted": {"students": [7]},
+                    "cursor": "eyJkZXBhcnRtZW50cyI6...",
+                    "has_more": false
+                }
+            """
+        try:
+            limit = min(int(request.query_params.get('limit', 500)), 1000)
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response({'success': False, 'message': "limit must be a positive integer."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            feed = build_change_feed(request.query_params.get('cursor'), limit)
+        except InvalidCursor:
+            return Response({'success': False, 'message': "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+        except ResyncRequired:
+            return Response({'success': False, 'resync': True,
+                             'message': "Cursor has expired, a full resync is required."},
+                            status=status.HTTP_410_GONE)
+        return Response({'success': True, **feed}, status=status.HTTP_200_OK)
+
+
+class AttendanceStreamView(View):
+    async def get(self, request, *args, **kwargs):
+        """
+            Handle GET requests to subscribe to live attendance writes as Server-Sent Events.
+
+            Requires an ASGI server (e.g. `uvicorn attendance_management.asgi:application`); each write is
+            pushed once to every subscriber whose course, department or class matches it.
+
+            Query Parameters:
+                course (int): Receive attendance marked for this course.
+                department (int): Receive attendance marked for courses of this department.
+                class_name (str): Together with `department`, receive attendance of the students in this class.
+
+            Events:
+                subscribed: Sent once with the topics of the subscription.
+                attendance: One attendance record, serialized like the attendance list.
+                resync: The client fell too far behind; it should catch up through `/changes/` and reconnect.
+
+            Raises:
+                HTTP_401_UNAUTHORIZED: If the request does not carry a valid access token.
+                HTTP_400_BAD_REQUEST: If no course, department or class is given.
+
+            Example:
+                GET /attendance/stream/?course=1
+
+                event: attendance
+                data: {"id": 3, "student": 1, "course": 1, "present": true, "submitted_by": 5, "updated_at": "..."}
+            """
+        try:
+            authenticated = await sync_to_async(JWTAuthentication().authenticate)(request)
+        except (AuthenticationFailed, InvalidToken) as err:
+            return JsonResponse({'success': False, 'message': str(err.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+        if authenticated is None:
+            return JsonResponse({'success': False, 'message': "Authentication credentials were not provided."},
+                                status=status.HTTP_401_UNAUTHORIZED)
+
+        topics = set()
+        course, department, class_name = (request.GET.get('course'), request.GET.get('department'),
+                                          request.GET.get('class_name'))
+        if course:
+            topics.add(f'course:{course}')
+        if department and class_name:
+            topics.add(f'class:{department}:{class_name}')
+        elif department:
+            topics.add(f'department:{department}')
+        if not topics:
+            return JsonResponse({'success': False, 'message': "Pass course, department or department and class_name."},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(event_stream(topics), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class CheckinTokenAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        """
+            Handle GET requests for the current self check-in token of a course.
+
+            The teacher's device requests a fresh token every window and shows it as a QR code. Tokens are signed,
+            bound to the course and time window, and stay valid until the end of the following window.
+
+            Query Parameters:
+                course (int): The ID of the course being lectured. This field is required.
+
+            Returns:
+                Response: A JSON response with the token and the time (UNIX seconds) the device should refresh it.
+
+            Raises:
+                HTTP_403_FORBIDDEN: If the user is not a teacher or staff member.
+                HTTP_404_NOT_FOUND: If the course does not exist.
+
+            Example:
+                GET /checkin/token/?course=1
+
+                Response:
+                {
+                    "success": True,
+                    "token": "1.1.57720000:Yk8yOTf3sFxV0v1b...",
+                    "refresh_at": 1731600030
+                }
+            """
+        if not (request.user.is_staff or request.user.type in ('teacher', 'admin')):
+            return Response({'detail': 'You do not have permission to perform this action.'},
+                            status=status.HTTP_403_FORBIDDEN)
+        try:
+            course = locate(Course.objects.only('id', 'department'), request.query_params.get('course'))
+        except (Course.DoesNotExist, ValueError):
+            return Response({'success': False, 'message': "Course not found."}, status=status.HTTP_404_NOT_FOUND)
+        token, refresh_at = issue_token(course)
+        return Response({'success': True, 'token': token, 'refresh_at': refresh_at}, status=status.HTTP_200_OK)
+
+
+class CheckinAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+    throttle_scope = 'checkin'
+
+    def post(self, request, *args, **kwargs):
+        """
+            Handle POST requests from students checking themselves in with a scanned token.
+
+            Only the signed token and the caller's own login are trusted: the token names the course and the
+            student is the one linked to the authenticated `student` account (`Student.user`), who must belong
+            to the course's class. Enrollment is checked against the cached roster, so the check-in is queued in
+            memory without queries; it is written to attendance as `present` with the next batch, usually within
+            a second.
+
+            Payload:
+                token (str): The token read from the teacher's QR code. This field is required.
+
+            Returns:
+                Response: A JSON response indicating whether the check-in was accepted.
+
+            Raises:
+                HTTP_400_BAD_REQUEST: If the body is not an object, the token is invalid or expired, or the caller
+                                      is not enrolled in the course's class.
+                HTTP_403_FORBIDDEN: If the caller is not a student account.
+
+            Example:
+                POST /checkin/
+                {
+                    "token": "1.1.57720000:Yk8yOTf3sFxV0v1b..."
+                }
+
+                Response:
+                {
+                    "success": True,
+                    "message": "Check-in accepted."
+                }
+            """
+        if request.user.type != 'student':
+            return Response({'detail': 'Only student accounts can check in.'}, status=status.HTTP_403_FORBIDDEN)
+        if not isinstance(request.data, dict):
+            return Response({'success': False, 'message': "The request body must be an object."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            course_id, department_id = verify_token(request.data.get('token'))
+        except InvalidCheckinToken as err:
+            return Response({'success': False, 'message': err.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+        course = roster_cache.course(course_id)
+        student = roster_cache.student_for_user(course, request.user.pk) if course is not None else None
+        if student is None:
+            return Response({'success': False, 'message': "You are not enrolled in this course's class."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not checkin_buffer.add(course_id, department_id, student.pk, request.user):
+            return Response({'success': True, 'message': "Already checked in."}, status=status.HTTP_200_OK)
+        return Response({'success': True, 'message': "Check-in accepted."}, status=status.HTTP_202_ACCEPTED)
+
+
+class LoadMetricsAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        """
+            Handle GET requests for the load-protection counters.
+
+            Returns:
+                Response: A JSON response with the number of throttled and shed requests since the cache was
+                last cleared, and the write requests currently running and queued in this process.
+
+            Raises:
+                HTTP_403_FORBIDDEN: If the user does not have staff permissions.
+
+            Example:
+                GET /metrics/load/
+
+                Response:
+                {
+                    "success": True,
+                    "data": {"throttled": 12, "shed": 0, "in_flight_writes": 3, "queued_writes": 0}
+                }
+            """
+        if not request.user.is_staff:
+            return Response({'detail': 'You do not have permission to perform this action.'},
+                            status=status.HTTP_403_FORBIDDEN)
+        return Response({'success': True, 'data': {**load_counters(), **admission_state()}}, status=status.HTTP_200_OK)
+
+
+class DatabaseMetricsAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        """
+            Handle GET requests for the size and fragmentation of the SQLite databases.
+
+            Returns:
+                Response: A JSON response with one entry per SQLite database. Free pages are returned to the
+                filesystem by `manage.py sqlite_maintenance`.
+
+            Raises:
+                HTTP_403_FORBIDDEN: If the user does not have staff permissions.
+
+            Example:
+                GET /metrics/database/
+
+                Response:
+                {
+                    "success": True,
+                    "data": [{"database": "default", "size_bytes": 52428800, "free_bytes": 1048576,
+                              "fragmentation": 0.02, "auto_vacuum": "incremental", "analyzed": true, ...}]
+                }
+            """
+        if not request.user.is_staff:
+            return Response({'detail': 'You do not have permission to perform this action.'},
+                            status=status.HTTP_403_FORBIDDEN)
+        return Response({'success': True, 'data': [database_stats(alias) for alias in sqlite_aliases()]},
+                        status=status.HTTP_200_OK)
+
+
+class AttendanceHistoryAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        """
+            Handle GET requests for the change history of attendance marks, newest first.
+
+            Query Parameters:
+                student (int): History of this student's marks.
+                course (int): History of the marks in this course.
+                attendance (int): History of one attendance record.
+                limit (int): The maximum number of entries returned (default 500, max 1000).
+
+            At least one of `student`, `course` or `attendance` is required.
+
+            Returns:
+                Response: A JSON response containing the journal entries.
+
+            Response Structure:
+                success (bool): Indicates if the request was successful.
+                data (list): Journal entries; `action` is 1 for a created mark and 2 for a changed one.
+
+            Example:
+                GET /attendance/history/?student=1
+
+                Response:
+                {
+                    "success": True,
+                    "data": [
+                        {
+                            "id": 9,
+                            "attendance_id": 3,
+                            "student_id": 1,
+                            "course_id": 1,
+                            "action": 2,
+                            "old_present": false,
+                            "new_present": true,
+                            "changed_by_id": 5,
+                            "changed_at": "2024-08-13T10:25:02.118736+05:30"
+                        }
+                    ]
+                }
+            """
+        filters = {}
+        try:
+            for param, field in (('student', 'student_id'), ('course', 'course_id'), ('attendance', 'attendance_id')):
+                if request.query_params.get(param):
+                    filters[field] = int(request.query_params[param])
+            limit = min(int(request.query_params.get('limit', 500)), 1000)
+        except ValueError:
+            return Response({'success': False, 'message': "student, course, attendance and limit must be integers."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not filters:
+            return Response({'success': False, 'message': "Pass student, course or attendance."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        journal.flush()
+        entries = AttendanceJournal.objects.filter(**filters).order_by('-changed_at', '-id')[:max(limit, 1)]
+        serializer = AttendanceJournalSerializer(entries, many=True, context={'request': request})
+        return Response({'success': True, 'data': serializer.data}, status=status.HTTP_200_OK)
+
+
+class ProfileListAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        """
+            Handle GET requests for the stored request profiles.
+
+            Profiles are captured by `api.profiling.ProfilingMiddleware` when `PROFILING_ENABLED` is set, for
+            requests sent by staff with `X-Profile: 1` (or `?profile=1`) and for sampled requests.
+
+            Returns:
+                Response: A JSON response with a summary of each capture, newest first.
+
+            Raises:
+                HTTP_403_FORBIDDEN: If the user does not have staff permissions.
+
+            Example:
+                GET /profiles/
+
+                Response:
+                {
+                    "success": True,
+                    "data": [{"id": "20261019T101500-1f2e3d4c", "method": "GET", "path": "/api/attendance/",
+                              "status": 200, "duration_ms": 812.4, "query_count": 3, "peak_memory_bytes": 5242880,
+                              "files": ["meta", "pstats", "stacks"], ...}]
+                }
+            """
+        if not request.user.is_staff:
+            return Response({'detail': 'You do not have permission to perform this action.'},
+                            status=status.HTTP_403_FORBIDDEN)
+        return Response({'success': True, 'data': list_captures()}, status=status.HTTP_200_OK)
+
+
+class ProfileDownloadAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, capture_id, kind, *args, **kwargs):
+        """
+            Handle GET requests to download one file of a stored request profile.
+
+            Path Parameters:
+                capture_id (str): The id of the capture, as listed by `/profiles/`.
+                kind (str): `meta` (SQL queries, timings and allocations as JSON), `pstats` (cProfile stats,
+                    open with `python -m pstats` or snakeviz) or `stacks` (folded stacks for flamegraph.pl
+                    or speedscope).
+
+            Raises:
+                HTTP_403_FORBIDDEN: If the user does not have staff permissions.
+                HTTP_404_NOT_FOUND: If the capture or file does not exist.
+
+            Example:
+                GET /profiles/20261019T101500-1f2e3d4c/stacks/
+            """
+        if not request.user.is_staff:
+            return Response({'detail': 'You do not have permission to perform this action.'},
+                            status=status.HTTP_403_FORBIDDEN)
+        path = capture_path(capture_id)
+        if path is None or kind not in CAPTURE_FILES or not (path / CAPTURE_FILES[kind]).exists():
+            return Response({'success': False, 'message': "Profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path / CAPTURE_FILES[kind], 'rb'), as_attachment=True,
+                            filename=f'{capture_id}-{CAPTURE_FILES[kind]}')
@@ -1,4 +1,5 @@
 import datetime
+from importlib.util import find_spec
 from pathlib import Path
 import os
 
@@ -33,12 +34,15 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = "api.User"
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'api.middleware.AdmissionControlMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'attendance_management.urls'
@@ -68,9 +72,88 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Seconds a write waits for SQLite's write lock; the change feed lag below depends on it.
+        'OPTIONS': {'timeout': 5},
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Idempotency-Key support on create endpoints: responses are replayed from the cache for a day.
+# Point IDEMPOTENCY_CACHE at a shared cache (Redis, Memcached, database) when running several processes.
+IDEMPOTENCY_CACHE = 'default'
+IDEMPOTENCY_TTL = 24 * 60 * 60
+IDEMPOTENCY_LOCK_SECONDS = 30
+IDEMPOTENCY_WAIT_SECONDS = 5
+
+# Department shards: each alias holds the courses, students and attendance of the departments mapped
+# to it by `Department.shard`. Add e.g. 'shard_1': {..., 'NAME': BASE_DIR / 'shard_1.sqlite3'} to
+# DATABASES, list it here and run `python manage.py init_shards`; `default` must stay first.
+SHARD_DATABASES = ['default']
+SHARD_ID_SPAN = 10 ** 12
+SHARD_MAP_TTL = 60
+DATABASE_ROUTERS = ['api.sharding.DepartmentShardRouter']
+
+# Attendance change journal: entries are buffered in memory and written in batches.
+JOURNAL_BATCH_SIZE = 500
+JOURNAL_FLUSH_SECONDS = 1
+
+# Largest number of ids a `?ids=` multi-get may ask for.
+MULTI_GET_MAX_IDS = 1000
+
+# Class dashboards are cached until attendance, a student or a course of the class changes; unused
+# entries expire after DASHBOARD_CACHE_TTL seconds. Use a shared cache when running several processes.
+DASHBOARD_CACHE = 'default'
+DASHBOARD_CACHE_TTL = 10 * 60
+
+# SQLite maintenance (`manage.py sqlite_maintenance`). Backups are copied SQLITE_BACKUP_PAGES pages at a
+# time with SQLITE_BACKUP_SLEEP seconds between steps so writers are not blocked. ANALYZE and incremental
+# vacuum only run in the local-time SQLITE_MAINTENANCE_WINDOW (start hour, end hour) unless forced.
+SQLITE_BACKUP_DIR = BASE_DIR / 'backups'
+SQLITE_BACKUP_PAGES = 256
+SQLITE_BACKUP_SLEEP = 0.05
+SQLITE_BACKUP_KEEP = 7
+SQLITE_ANALYSIS_LIMIT = 1000
+SQLITE_VACUUM_STEP_PAGES = 500
+SQLITE_VACUUM_SLEEP = 0.1
+SQLITE_VACUUM_MAX_SECONDS = 60
+SQLITE_MAINTENANCE_WINDOW = (2, 5)
+SQLITE_MAINTENANCE_INTERVAL = 6 * 60 * 60
+
+# Course -> class and class -> student rosters used to validate attendance writes are cached
+# in each process for ROSTER_CACHE_TTL seconds (and dropped sooner on local Student/Course saves).
+ROSTER_CACHE_TTL = 300
+
+# Archived attendance terms (see `manage.py archive_attendance`) are stored under ARCHIVE_DIR.
+ARCHIVE_DIR = BASE_DIR / 'archives'
+
+# Change feed: rows newer than CHANGE_FEED_LAG seconds wait for the next call so late commits are not
+# skipped; tombstones older than CHANGE_FEED_RETENTION_DAYS are pruned and such cursors must resync.
+# `updated_at` is stamped before a write waits for the SQLite lock and may wait again to commit, so the
+# lag must exceed twice the busy timeout plus CHANGE_FEED_MAX_WRITE_SECONDS, the longest a write runs
+# after stamping its rows (rollovers stamp theirs last). A system check enforces this.
+CHANGE_FEED_LAG = 30
+CHANGE_FEED_MAX_WRITE_SECONDS = 10
+CHANGE_FEED_RETENTION_DAYS = 30
+
+# Live attendance push (Server-Sent Events, served through asgi.py). Swap PUSH_BROKER for a shared
+# broker class with the same interface when running several ASGI processes.
+PUSH_BROKER = 'api.push.InProcessBroker'
+PUSH_MAX_PENDING_EVENTS = 100
+PUSH_HEARTBEAT_SECONDS = 15
+
+# Student self check-in: tokens rotate every window and are accepted for one more; check-ins are
+# deduplicated per course and student for CHECKIN_DEDUP_SECONDS and written in batches.
+CHECKIN_WINDOW_SECONDS = 30
+CHECKIN_DEDUP_SECONDS = 3 * 60 * 60
+CHECKIN_BATCH_SIZE = 200
+CHECKIN_FLUSH_SECONDS = 1
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -113,9 +196,59 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+    ),
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.UserTokenBucketThrottle',
+        'api.throttling.ScopedTokenBucketThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'user': '600/min',
+        'login': '10/min',
+        'attendance': '1200/min',
+        'checkin': '30/min',
+    },
 }
 
+# Binary wire formats are offered when their package is installed: MessagePack (`msgpack`) and
+# CBOR (`cbor2`), both pinned in requirements-optional.txt. Any format can use the columnar list layout
+# with `Accept: <type>; layout=columnar`.
+if find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('api.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append('api.renderers.MessagePackParser')
+if find_spec('cbor2'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('api.renderers.CBORRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append('api.renderers.CBORParser')
+
+# Response compression, see api.middleware.CompressionMiddleware. zstd and br need the `zstandard`
+# and `brotli` packages (requirements-optional.txt); gzip is always available.
+COMPRESSION_MIN_LENGTH = 200
+# Only API media types are compressed; HTML pages with CSRF tokens stay uncompressed because of BREACH.
+COMPRESSION_CONTENT_TYPES = ('application/json', 'application/msgpack', 'application/cbor', 'text/event-stream')
+COMPRESSION_LEVELS = {'gzip': 6, 'br': 5, 'zstd': 3}
+
+# On-demand request profiling, see api.profiling.ProfilingMiddleware. When disabled the middleware is
+# not installed at all. Staff trigger a capture with `X-Profile: 1`; PROFILING_SAMPLE_RATE (0..1) also
+# profiles that share of all requests. At most PROFILING_MAX_CAPTURES are kept in PROFILING_DIR.
+PROFILING_ENABLED = False
+PROFILING_SAMPLE_RATE = 0
+PROFILING_MAX_CAPTURES = 50
+PROFILING_DIR = BASE_DIR / 'profiles'
+
+# Admission control for write requests (per process), see api.middleware.AdmissionControlMiddleware.
+ADMISSION_MAX_CONCURRENT_WRITES = 8
+ADMISSION_MAX_QUEUED = 32
+ADMISSION_QUEUE_TIMEOUT = 2
+ADMISSION_RETRY_AFTER = 1
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
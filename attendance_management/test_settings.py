@@ -0,0 +1,12 @@
+"""Settings for `python manage.py test`: the project settings plus a second shard for the sharding tests."""
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+# Only tests that turn on SHARD_DATABASES=['default', 'shard_1'] route rows to it. Its test database is a file
+# so the SQLite maintenance tests have an on-disk database to back up and vacuum.
+DATABASES['shard_1'] = {
+    **DATABASES['default'],
+    'NAME': BASE_DIR / 'shard_1.sqlite3',
+    'TEST': {'NAME': os.path.join(tempfile.gettempdir(), 'attendance_management_test_shard_1.sqlite3')},
+}
@@ -7,7 +7,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'attendance_management.settings')
+    # `test` runs with the test settings, which add the databases the test suite needs.
+    settings_module = 'attendance_management.test_settings' if sys.argv[1:2] == ['test'] else 'attendance_management.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc: